@@ -8,7 +8,19 @@ if [ -n "${DATABASE_PATH:-}" ]; then
     fi
 fi
 
-python manage.py collectstatic --noinput
-python manage.py migrate --noinput
+# Static files are collected at image build time. When /app/staticfiles is an
+# empty shared volume (nginx sidecar), seed it from the build output instead of
+# booting Django to run collectstatic again.
+if [ -d /app/staticfiles.dist ] && [ -z "$(ls -A /app/staticfiles 2>/dev/null)" ]; then
+    mkdir -p /app/staticfiles
+    cp -a /app/staticfiles.dist/. /app/staticfiles/
+fi
+
+python manage.py migrate_if_needed
+
+# Keep pre-rendered archived threads in sync for the nginx sidecar.
+if [ -n "${SNAPSHOT_ROOT:-}" ] && [ "${1:-}" = "uvicorn" ]; then
+    python manage.py build_snapshots --interval "${SNAPSHOT_INTERVAL:-300}" &
+fi
 
 exec "$@"
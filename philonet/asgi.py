@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'philonet.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. Event streams are served ahead of the
+# middleware stack so idle clients don't each hold a thread.
+from questions.sse import EventStreamDispatcher  # noqa: E402
+
+application = EventStreamDispatcher(django_application)
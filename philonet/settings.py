@@ -73,10 +73,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'questions.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'questions.usercache.CachedAuthenticationMiddleware',
+    'questions.profiling.ProfilerMiddleware',
+    'questions.slowqueries.SlowQueryViewMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,6 +110,17 @@ WSGI_APPLICATION = 'philonet.wsgi.application'
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 POSTGRES_HOST = os.environ.get('POSTGRES_HOST')
+# Give up on connecting to a restarting Postgres quickly so pages can fall back to their stale copies.
+POSTGRES_OPTIONS = {'connect_timeout': int(os.environ.get('POSTGRES_CONNECT_TIMEOUT', '3'))}
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KIB', str(64 * 1024))),
+    'temp_store': 'MEMORY',
+}
 
 if DATABASE_URL:
     parsed_url = urlparse(DATABASE_URL)
@@ -121,6 +135,7 @@ if DATABASE_URL:
             'HOST': parsed_url.hostname or '',
             'PORT': str(parsed_url.port or 5432),
             'CONN_MAX_AGE': 60,
+            'OPTIONS': POSTGRES_OPTIONS,
         }
     }
 elif POSTGRES_HOST:
@@ -133,6 +148,7 @@ elif POSTGRES_HOST:
             'HOST': POSTGRES_HOST,
             'PORT': os.environ.get('POSTGRES_PORT', '5432'),
             'CONN_MAX_AGE': 60,
+            'OPTIONS': POSTGRES_OPTIONS,
         }
     }
 else:
@@ -143,11 +159,44 @@ else:
             'NAME': DATABASE_PATH,
         }
     }
+    # Tuned for concurrent writers: WAL, relaxed fsync, BEGIN IMMEDIATE and one writer per process.
+    # SQLITE_TUNED=false restores SQLite's defaults.
+    if _env_flag(os.environ.get('SQLITE_TUNED'), default=True):
+        DATABASES['default'].update({
+            'ENGINE': 'questions.sqlite',
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        })
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Set REDIS_URL so rate limits and cached pages are shared by all workers and replicas.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
+# Built by `manage.py build_password_list`; see questions.validators.CommonPasswordListValidator.
+COMMON_PASSWORD_LIST_PATH = os.environ.get('COMMON_PASSWORD_LIST_PATH', str(BASE_DIR / 'common-passwords.bin'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -163,7 +212,10 @@ AUTH_PASSWORD_VALIDATORS = [
         },
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'questions.validators.CommonPasswordListValidator',
+        'OPTIONS': {
+            'password_list_path': COMMON_PASSWORD_LIST_PATH,
+        },
     },
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
@@ -175,14 +227,10 @@ AUTH_PASSWORD_VALIDATORS = [
 
 DEFAULT_PBKDF2_ITERATIONS = PBKDF2PasswordHasher.iterations
 PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_HASHER_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS))
-
-
-class _ConfigurablePBKDF2Hasher(PBKDF2PasswordHasher):
-    iterations = PBKDF2_ITERATIONS
-
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', '2'))
 
 PASSWORD_HASHERS = [
-    'philonet.settings._ConfigurablePBKDF2Hasher',
+    'questions.hashers.BoundedPBKDF2PasswordHasher',
 ]
 
 
@@ -211,6 +259,56 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'question_list'
 LOGOUT_REDIRECT_URL = 'question_list'
 
+# Write limits per user (or per IP when logged out), as "<count>/<s|m|h|d>".
+RATE_LIMITS = {
+    'vote': os.environ.get('RATE_LIMIT_VOTE', '30/m'),
+    'comment': os.environ.get('RATE_LIMIT_COMMENT', '10/m'),
+    'question': os.environ.get('RATE_LIMIT_QUESTION', '5/m'),
+    'signup': os.environ.get('RATE_LIMIT_SIGNUP', '10/h'),
+}
+# Proxies in front of the app that append to X-Forwarded-For (the nginx sidecar counts as one); 0 uses REMOTE_ADDR.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+# Only enable when the origin can be reached through Cloudflare alone; otherwise the header is client-controlled.
+TRUST_CF_CONNECTING_IP = _env_flag(os.environ.get('TRUST_CF_CONNECTING_IP'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Live updates fan out in-process; with REDIS_URL they are relayed to every worker and replica.
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or (
+    'questions.events.RedisBroker' if REDIS_URL else 'questions.events.LocalBroker'
+)
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '25'))
+
+# Superusers can profile a request with ?__profile=1 or an X-Profile header; the newest profiles are kept.
+PROFILER_RING_SIZE = int(os.environ.get('PROFILER_RING_SIZE', '50'))
+
+# Statements slower than this are logged with their call site (empty disables); the newest entries are kept.
+_slow_query_threshold = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200')
+SLOW_QUERY_THRESHOLD_MS = float(_slow_query_threshold) if _slow_query_threshold else None
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', '10000'))
+
+# Pre-rendered pages of archived threads, written by build_snapshots and served by the nginx sidecar (empty disables).
+SNAPSHOT_ROOT = os.environ.get('SNAPSHOT_ROOT') or None
+
+# HTML and JSON responses at least this large are gzipped for clients that accept it.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSIBLE_CONTENT_TYPES = ('text/html', 'application/json')
+
+# The session user (with profile) is cached this long; saves to User/Profile drop the entry sooner.
+USER_CACHE_SECONDS = int(os.environ.get('USER_CACHE_SECONDS', '60'))
+
+# Threads with at least this many comments are streamed to the browser in chunks instead of rendered whole.
+STREAMING_THREAD_MIN_COMMENTS = int(os.environ.get('STREAMING_THREAD_MIN_COMMENTS', '300'))
+
+# Anonymous front and thread pages whose queries take longer than this (or fail) get their last known good copy instead.
+DB_DEADLINE_SECONDS = float(os.environ.get('DB_DEADLINE_SECONDS', '2'))
+STALE_CACHE_SECONDS = int(os.environ.get('STALE_CACHE_SECONDS', '86400'))
+STALE_REMEMBER_SECONDS = int(os.environ.get('STALE_REMEMBER_SECONDS', '30'))
+# After this many database failures in a row pages are served stale, with one refresh tried every reset interval.
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+CIRCUIT_RESET_SECONDS = int(os.environ.get('CIRCUIT_RESET_SECONDS', '15'))
+
+FRONT_PAGE_CACHE_SECONDS = int(os.environ.get('FRONT_PAGE_CACHE_SECONDS', '30'))
+
 SITE_URL = os.environ.get('SITE_URL', 'https://forum.philosofriends.com')
 EMAIL_NOTIFICATIONS_ENABLED = _env_flag(os.environ.get('EMAIL_NOTIFICATIONS_ENABLED'), default=False)
 SMTP2GO_API_URL = os.environ.get('SMTP2GO_API_URL', 'https://api.smtp2go.com/v3/email/send')
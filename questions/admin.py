@@ -1,36 +1,443 @@
-from django.contrib import admin
+from datetime import timedelta
 
-from .models import Comment, Profile, Question
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Q
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .archive import unarchive_question
+from .caching import invalidate_front_page
+from .directory import invalidate_directory
+from .forms import MoveCommentsForm
+from .models import AccountDeletion, ArchivedThread, Comment, Profile, Question, RequestProfile, SlowQuery
+from .purge import delete_user_content, update_in_batches
+from .slowqueries import summarize
+from .usercache import forget_users
+
+# Filtered changelists count at most this many rows; beyond it the changelist shows "More than COUNT_CAP".
+COUNT_CAP = 10_000
+
+
+def _estimated_row_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+        return None
+    # Elsewhere the highest id is an index lookup and a close upper bound.
+    return queryset.model._default_manager.using(queryset.db).aggregate(highest=Max('pk'))['highest']
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count never scans a whole table.
+
+    Unfiltered changelists use the planner's row estimate on PostgreSQL (the
+    highest id elsewhere); filtered ones count at most COUNT_CAP rows and set
+    ``capped`` when there are more.
+    """
+
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = _estimated_row_count(queryset)
+            if estimate is not None:
+                return estimate
+        counted = queryset.order_by()[:COUNT_CAP + 1].count()
+        self.capped = counted > COUNT_CAP
+        return min(counted, COUNT_CAP)
+
+
+class CreatedRecentlyFilter(admin.SimpleListFilter):
+    """Fixed ranges on the indexed created_at column, instead of date_hierarchy's DISTINCT-date scans."""
+
+    title = 'created'
+    parameter_name = 'created'
+    ranges = {
+        'day': ('Past 24 hours', timedelta(days=1)),
+        'week': ('Past 7 days', timedelta(days=7)),
+        'month': ('Past 30 days', timedelta(days=30)),
+        'year': ('Past year', timedelta(days=365)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.ranges.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.ranges:
+            return queryset.filter(created_at__gte=timezone.now() - self.ranges[self.value()][1])
+        return queryset
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults that stay cheap on large tables.
+
+    Search only uses indexed lookups: a number matches the primary key, text
+    matches a username prefix (btree pattern index) and, for models with a
+    search_document_field, a full-text match backed by a GIN index on
+    PostgreSQL (a plain substring match on other databases).
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_user_field = None
+    search_document_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        conditions = Q()
+        if self.search_user_field:
+            matching_users = User.objects.filter(username__startswith=term).values('pk')[:50]
+            conditions |= Q(**{f'{self.search_user_field}__in': matching_users})
+        if self.search_document_field:
+            if connections[queryset.db].vendor == 'postgresql':
+                from django.contrib.postgres.search import SearchQuery, SearchVector
+
+                queryset = queryset.annotate(
+                    search_document=SearchVector(self.search_document_field, config='english')
+                )
+                conditions |= Q(search_document=SearchQuery(term, config='english'))
+            else:
+                conditions |= Q(**{f'{self.search_document_field}__icontains': term})
+        return queryset.filter(conditions), False
+
+
+def _delete_authors_content(modeladmin, request, user_ids):
+    totals = delete_user_content(user_ids)
+    invalidate_front_page()
+    modeladmin.message_user(
+        request,
+        'Deleted {questions_deleted} questions, {comments_deleted} comments and {votes_deleted} votes; '
+        'detached {replies_detached} replies.'.format(**totals),
+        messages.SUCCESS,
+    )
+
+
+def _set_pinned(modeladmin, request, queryset, pinned):
+    updated = update_in_batches(queryset.exclude(pinned=pinned), pinned=pinned)
+    invalidate_front_page()
+    modeladmin.message_user(request, f'{"Pinned" if pinned else "Unpinned"} {updated} questions.', messages.SUCCESS)
+
+
+def move_comments(target, queryset):
+    """
+    Move comments and their reply chains under ``target`` with chunked UPDATEs.
+
+    Replies are pulled across one nesting level per pass; moved comments whose
+    parent stayed in the old thread become top-level comments. updated_at is
+    bumped so open threads pick the moved comments up on their next poll.
+    """
+    now = timezone.now()
+    moved = update_in_batches(queryset.exclude(question=target), question=target, updated_at=now)
+    while True:
+        replies = update_in_batches(
+            Comment.objects.filter(parent__question=target).exclude(question=target),
+            question=target,
+            updated_at=now,
+        )
+        if not replies:
+            break
+        moved += replies
+    update_in_batches(
+        Comment.objects.filter(question=target, parent__isnull=False).exclude(parent__question=target),
+        parent=None,
+    )
+    return moved
 
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(ScalableAdmin):
     list_display = ('title', 'slug', 'author', 'created_at', 'pinned')
-    search_fields = ('title', 'body', 'author__username')
-    list_filter = ('pinned',)
+    list_select_related = ('author',)
+    search_fields = ('title', 'author__username')
+    search_help_text = 'Search by id, author username prefix, or words in the title.'
+    search_user_field = 'author'
+    search_document_field = 'title'
+    list_filter = ('pinned', CreatedRecentlyFilter)
+    raw_id_fields = ('author',)
     ordering = ('-pinned', '-created_at')
+    actions = ('pin_questions', 'unpin_questions', 'delete_authors_content')
+
+    @admin.action(description='Pin selected questions', permissions=['change'])
+    def pin_questions(self, request, queryset):
+        _set_pinned(self, request, queryset, True)
+
+    @admin.action(description='Unpin selected questions', permissions=['change'])
+    def unpin_questions(self, request, queryset):
+        _set_pinned(self, request, queryset, False)
+
+    @admin.action(description="Delete all content by the selected questions' authors", permissions=['delete'])
+    def delete_authors_content(self, request, queryset):
+        _delete_authors_content(self, request, queryset.values_list('author_id', flat=True).distinct())
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ('question', 'author', 'parent', 'created_at')
-    search_fields = ('body', 'author__username', 'question__title')
+    list_select_related = ('question', 'author', 'parent__author', 'parent__question')
+    search_fields = ('body', 'author__username')
+    search_help_text = 'Search by id, author username prefix, or words in the comment.'
+    search_user_field = 'author'
+    search_document_field = 'body'
+    list_filter = (CreatedRecentlyFilter,)
+    raw_id_fields = ('question', 'parent', 'author')
     ordering = ('-created_at',)
+    actions = ('move_to_question', 'delete_authors_content')
+
+    @admin.action(description='Move selected comments to another question', permissions=['change'])
+    def move_to_question(self, request, queryset):
+        form = MoveCommentsForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            moved = move_comments(form.cleaned_data['target'], queryset)
+            invalidate_front_page()
+            self.message_user(request, f'Moved {moved} comments.', messages.SUCCESS)
+            return None
+        return TemplateResponse(
+            request,
+            'admin/questions/comment/move_comments.html',
+            {
+                **self.admin_site.each_context(request),
+                'title': 'Move comments',
+                'opts': self.model._meta,
+                'form': form,
+                'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'action': 'move_to_question',
+                'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            },
+        )
+
+    @admin.action(description="Delete all content by the selected comments' authors", permissions=['delete'])
+    def delete_authors_content(self, request, queryset):
+        _delete_authors_content(self, request, queryset.values_list('author_id', flat=True).distinct())
+
+
+@admin.register(ArchivedThread)
+class ArchivedThreadAdmin(admin.ModelAdmin):
+    list_display = ('question', 'comments_count', 'score', 'archived_at')
+    list_select_related = ('question',)
+    fields = ('question', 'comments_count', 'score', 'archived_at')
+    readonly_fields = fields
+    ordering = ('-archived_at',)
+    actions = ('unarchive_threads',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Restore selected threads to live comments', permissions=['delete'])
+    def unarchive_threads(self, request, queryset):
+        restored = 0
+        for archive in queryset.select_related('question'):
+            restored += unarchive_question(archive.question)
+        invalidate_front_page()
+        self.message_user(request, f'Restored {restored} comments.', messages.SUCCESS)
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(ScalableAdmin):
     list_display = (
         'user',
         'is_vip',
         'notify_new_posts',
+        'new_posts_frequency',
         'notify_replies_to_comments',
         'notify_replies_to_posts',
     )
-    search_fields = ('user__username', 'user__email')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    search_help_text = 'Search by id or username prefix.'
+    search_user_field = 'user'
+    raw_id_fields = ('user',)
+    actions = ('toggle_vip', 'delete_users_content')
     list_filter = (
         'is_vip',
         'notify_new_posts',
+        'new_posts_frequency',
         'notify_replies_to_comments',
         'notify_replies_to_posts',
     )
+
+    @admin.action(description='Toggle VIP for selected users', permissions=['change'])
+    def toggle_vip(self, request, queryset):
+        # Read the ids first: the queryset may filter on is_vip and match nothing after the update.
+        user_ids = list(queryset.values_list('user_id', flat=True))
+        updated = update_in_batches(queryset, is_vip=~F('is_vip'))
+        forget_users(user_ids)
+        invalidate_directory()
+        invalidate_front_page()
+        self.message_user(request, f'Toggled VIP for {updated} users.', messages.SUCCESS)
+
+    @admin.action(description='Delete all content by the selected users', permissions=['delete'])
+    def delete_users_content(self, request, queryset):
+        _delete_authors_content(self, request, queryset.values_list('user_id', flat=True))
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = (
+        'username',
+        'status',
+        'questions_deleted',
+        'comments_deleted',
+        'votes_deleted',
+        'replies_detached',
+        'requested_at',
+        'completed_at',
+    )
+    list_filter = ('status',)
+    search_fields = ('username',)
+    readonly_fields = list_display + ('user',)
+    ordering = ('-requested_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'user')
+    list_select_related = ('user',)
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    ordering = ('-id',)
+    exclude = ('report', 'pstats')
+    readonly_fields = (
+        'path',
+        'method',
+        'status_code',
+        'user',
+        'duration_ms',
+        'sql_count',
+        'sql_ms',
+        'created_at',
+        'download',
+        'top_functions',
+        'templates',
+        'queries',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/pstats/',
+                self.admin_site.admin_view(self.download_pstats),
+                name='questions_requestprofile_pstats',
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_pstats(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.pstats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.pstats"'
+        return response
+
+    @admin.display(description='pstats')
+    def download(self, obj):
+        url = reverse('admin:questions_requestprofile_pstats', args=[obj.pk])
+        return format_html('<a href="{}">profile-{}.pstats</a> (open with <code>python -m pstats</code>)', url, obj.pk)
+
+    @staticmethod
+    def _table(headers, rows):
+        return format_html(
+            '<table><thead><tr>{}</tr></thead><tbody>{}</tbody></table>',
+            format_html_join('', '<th>{}</th>', ((header,) for header in headers)),
+            format_html_join('', '<tr>' + '<td>{}</td>' * len(headers) + '</tr>', rows),
+        )
+
+    @admin.display(description='Top functions (by cumulative time)')
+    def top_functions(self, obj):
+        return self._table(
+            ('Function', 'Calls', 'Own ms', 'Cumulative ms'),
+            (
+                (row['function'], row['calls'], row['own_ms'], row['cumulative_ms'])
+                for row in obj.report.get('functions', [])
+            ),
+        )
+
+    @admin.display(description='Templates (inclusive time)')
+    def templates(self, obj):
+        return self._table(
+            ('Template', 'Renders', 'ms'),
+            ((row['name'], row['renders'], round(row['ms'], 3)) for row in obj.report.get('templates', [])),
+        )
+
+    @admin.display(description='SQL')
+    def queries(self, obj):
+        return self._table(
+            ('Database', 'ms', 'SQL'),
+            ((row['alias'], row['ms'], row['sql']) for row in obj.report.get('queries', [])),
+        )
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'view_name', 'call_site', 'sql')
+    list_filter = ('view_name',)
+    search_fields = ('fingerprint', 'call_site')
+    ordering = ('-id',)
+    change_list_template = 'admin/questions/slowquery/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                'summary/',
+                self.admin_site.admin_view(self.summary_view),
+                name='questions_slowquery_summary',
+            ),
+            *super().get_urls(),
+        ]
+
+    def summary_view(self, request):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        return TemplateResponse(
+            request,
+            'admin/questions/slowquery/summary.html',
+            {
+                **self.admin_site.each_context(request),
+                'title': 'Slow queries by fingerprint',
+                'opts': self.model._meta,
+                'summary': summarize(SlowQuery.objects.all()),
+            },
+        )
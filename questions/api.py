@@ -0,0 +1,205 @@
+import hashlib
+import json
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .archive import archived_comment_rows
+from .models import Question
+from .pagination import decode_cursor, encode_cursor
+from .queries import (
+    NEW_FEED_ORDERING,
+    NEW_FEED_PAGE_SIZE,
+    comment_depths,
+    depths_from_parents,
+    hot_rank,
+    hot_sort_key,
+    new_feed_page_ids,
+    question_feed,
+    thread_comments,
+)
+
+COMMENTS_PAGE_SIZE = 100
+
+# Public field name -> expression passed to .values().
+QUESTION_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'body': 'body',
+    'link': 'link',
+    'created_at': 'created_at',
+    'pinned': 'pinned',
+    'author': 'author__username',
+    'score': 'score',
+    'comments_count': 'comments_count',
+}
+QUESTION_LIST_DEFAULT_FIELDS = ('id', 'slug', 'title', 'link', 'created_at', 'pinned', 'author', 'score', 'comments_count')
+COMMENT_FIELDS = {
+    'id': 'id',
+    'parent_id': 'parent_id',
+    'author': 'author__username',
+    'body': 'body',
+    'created_at': 'created_at',
+}
+PROFILE_FIELDS = {
+    'username': 'username',
+    'is_vip': 'profile__is_vip',
+    'date_joined': 'date_joined',
+    'question_count': 'question_count',
+    'comment_count': 'comment_count',
+}
+
+
+def _requested_fields(request, available, default=None):
+    """Parse ?fields=a,b into public field names, ignoring unknown names."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default or available)
+    fields = [name for name in dict.fromkeys(part.strip() for part in raw.split(',')) if name in available]
+    return fields or list(default or available)
+
+
+def _project(row, fields, available):
+    return {name: row[available[name]] for name in fields if available.get(name) in row}
+
+
+def _json_response(request, payload):
+    content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    etag = quote_etag(hashlib.sha1(content).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response.headers['ETag'] = etag
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+@require_GET
+def question_list(request):
+    sort = request.GET.get('sort')
+    fields = _requested_fields(request, QUESTION_FIELDS, QUESTION_LIST_DEFAULT_FIELDS)
+    columns = [QUESTION_FIELDS[name] for name in fields]
+    if request.user.is_authenticated:
+        columns.append('has_voted')
+    cursor = request.GET.get('cursor')
+    if sort == 'new':
+        page_ids, next_cursor = new_feed_page_ids(cursor, NEW_FEED_PAGE_SIZE)
+        rows = list(
+            question_feed(request.user)
+            .filter(pk__in=page_ids)
+            .order_by(*NEW_FEED_ORDERING)
+            .values(*columns)
+        )
+    else:
+        # The hot ranking changes with the clock, so it is paged by position
+        # in the ranking computed for this request rather than by a keyset.
+        offset = decode_cursor(cursor) or [0]
+        try:
+            offset = max(int(offset[0]), 0)
+        except (TypeError, ValueError):
+            offset = 0
+        now = timezone.now()
+        ranking = list(
+            question_feed()
+            .values_list('pk', 'pinned', 'score', 'comments_count', 'created_at')
+        )
+        ranking.sort(
+            key=lambda item: hot_sort_key(
+                item[1], hot_rank(item[2], item[3], item[4], now), item[2], item[4]
+            )
+        )
+        page_ids = [item[0] for item in ranking[offset:offset + NEW_FEED_PAGE_SIZE]]
+        next_offset = offset + NEW_FEED_PAGE_SIZE
+        next_cursor = encode_cursor([next_offset]) if next_offset < len(ranking) else None
+        rows_by_id = {
+            row['id']: row
+            for row in question_feed(request.user).filter(pk__in=page_ids).values(*dict.fromkeys(['id', *columns]))
+        }
+        rows = [rows_by_id[pk] for pk in page_ids if pk in rows_by_id]
+    results = []
+    for row in rows:
+        item = _project(row, fields, QUESTION_FIELDS)
+        if 'has_voted' in row:
+            item['has_voted'] = row['has_voted']
+        results.append(item)
+    return _json_response(request, {'results': results, 'next': next_cursor})
+
+
+@require_GET
+def question_detail(request, pk):
+    fields = _requested_fields(request, QUESTION_FIELDS)
+    row = question_feed(request.user).filter(pk=pk).values(*[QUESTION_FIELDS[name] for name in fields]).first()
+    if row is None:
+        raise Http404('Question not found.')
+    return _json_response(request, _project(row, fields, QUESTION_FIELDS))
+
+
+@require_GET
+def question_comments(request, pk):
+    question = Question.objects.select_related('archive').filter(pk=pk).first()
+    if question is None:
+        raise Http404('Question not found.')
+    fields = _requested_fields(request, {**COMMENT_FIELDS, 'depth': None})
+    columns = [COMMENT_FIELDS[name] for name in fields if name in COMMENT_FIELDS]
+    values = decode_cursor(request.GET.get('cursor'))
+    try:
+        after = datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError, IndexError):
+        after = None
+    if after is not None and timezone.is_naive(after[0]):
+        # Cursors we issue always carry an offset; a naive one cannot be compared with stored times.
+        after = None
+    archive = getattr(question, 'archive', None)
+    if archive is not None:
+        # Archived threads are one decompressed blob; page over it in memory.
+        archived = archived_comment_rows(archive)
+        rows = [row for row in archived if after is None or (row['created_at'], row['id']) > after]
+        rows = rows[:COMMENTS_PAGE_SIZE + 1]
+    else:
+        comments = thread_comments(pk)
+        if after is not None:
+            created_at, last_id = after
+            comments = comments.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=last_id))
+        rows = list(comments.values(*dict.fromkeys(['id', 'parent_id', 'created_at', *columns]))[:COMMENTS_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(rows) > COMMENTS_PAGE_SIZE:
+        rows = rows[:COMMENTS_PAGE_SIZE]
+        next_cursor = encode_cursor([rows[-1]['created_at'].isoformat(), rows[-1]['id']])
+    depths = {}
+    if 'depth' in fields:
+        if archive is not None:
+            depths = depths_from_parents({row['id']: row['parent_id'] for row in archived})
+        else:
+            depths = comment_depths({row['id']: row['parent_id'] for row in rows})
+    results = []
+    for row in rows:
+        item = _project(row, fields, COMMENT_FIELDS)
+        if 'depth' in fields:
+            item['depth'] = depths.get(row['id'], 0)
+        results.append(item)
+    return _json_response(request, {'results': results, 'next': next_cursor})
+
+
+@require_GET
+def profile_detail(request, username):
+    fields = _requested_fields(request, PROFILE_FIELDS)
+    row = (
+        User.objects.filter(username=username, is_active=True)
+        .annotate(
+            question_count=Count('questions', distinct=True),
+            comment_count=Count('comments', distinct=True),
+        )
+        .values(*[PROFILE_FIELDS[name] for name in fields])
+        .first()
+    )
+    if row is None:
+        raise Http404('User not found.')
+    return _json_response(request, _project(row, fields, PROFILE_FIELDS))
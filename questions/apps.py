@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class QuestionsConfig(AppConfig):
     name = 'questions'
+
+    def ready(self):
+        from .slowqueries import install
+
+        connection_created.connect(install, dispatch_uid='questions.slow_query_logger')
@@ -0,0 +1,180 @@
+import json
+import zlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .forumdump import DumpEncoder
+from .models import ArchivedThread, Comment, Question, Vote
+
+ARCHIVE_FORMAT = 1
+ARCHIVED_COMMENT_FIELDS = (
+    'id',
+    'parent_id',
+    'author_id',
+    'author__username',
+    'author__profile__is_vip',
+    'body',
+    'body_html',
+    'created_at',
+    'updated_at',
+)
+
+
+def stale_threads(cutoff):
+    """Unpinned, unarchived questions older than ``cutoff`` with no comment edits or votes since then."""
+    return (
+        Question.objects.filter(created_at__lt=cutoff, pinned=False, archive__isnull=True)
+        .filter(~Exists(Comment.objects.filter(question=OuterRef('pk'), updated_at__gte=cutoff)))
+        .filter(~Exists(Vote.objects.filter(question=OuterRef('pk'), created_at__gte=cutoff)))
+    )
+
+
+def _pack(rows):
+    payload = json.dumps({'version': ARCHIVE_FORMAT, 'comments': rows}, cls=DumpEncoder, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 9)
+
+
+def archive_question(question, cutoff):
+    """
+    Move a thread's comments into one compressed ArchivedThread row and freeze its score.
+
+    The question row is locked and checked against ``stale_threads(cutoff)``
+    again inside the transaction; a thread that has seen activity since it was
+    picked is left alone and None is returned. Only the comments read into the
+    blob are deleted.
+    """
+    with transaction.atomic():
+        if stale_threads(cutoff).select_for_update(of=('self',)).filter(pk=question.pk).first() is None:
+            return None
+        rows = list(
+            Comment.objects.filter(question=question)
+            .order_by('created_at', 'id')
+            .values(*ARCHIVED_COMMENT_FIELDS)
+        )
+        archive = ArchivedThread.objects.create(
+            question=question,
+            comments_blob=_pack(rows),
+            comments_count=len(rows),
+            score=Vote.objects.filter(question=question).count(),
+        )
+        archive.participants.set({row['author_id'] for row in rows})
+        archived_ids = [row['id'] for row in rows]
+        # Detach first so the delete needs no SET_NULL pass over the thread's own replies.
+        Comment.objects.filter(pk__in=archived_ids, parent__isnull=False).update(parent=None)
+        Comment.objects.filter(pk__in=archived_ids).delete()
+    return archive
+
+
+def archive_stale_threads(months, batch_size=100, limit=None, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=30 * months)
+    archived = 0
+    last_pk = 0
+    while True:
+        candidates = list(stale_threads(cutoff).filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not candidates:
+            return archived
+        for question in candidates:
+            if limit is not None and archived >= limit:
+                return archived
+            if archive_question(question, cutoff) is not None:
+                archived += 1
+        last_pk = candidates[-1].pk
+
+
+def archived_comment_rows(archive):
+    """The archived comments as dicts (ARCHIVED_COMMENT_FIELDS keys), oldest first."""
+    payload = json.loads(zlib.decompress(bytes(archive.comments_blob)))
+    rows = payload['comments']
+    for row in rows:
+        row['created_at'] = parse_datetime(row['created_at'])
+        row['updated_at'] = parse_datetime(row['updated_at'])
+    return rows
+
+
+def archived_comments(archive):
+    """Unsaved Comment objects for rendering an archived thread; bylines come from the user directory."""
+    return [
+        Comment(
+            id=row['id'],
+            question_id=archive.question_id,
+            parent_id=row['parent_id'],
+            author_id=row['author_id'],
+            body=row['body'],
+            body_html=row['body_html'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+        )
+        for row in archived_comment_rows(archive)
+    ]
+
+
+def remove_archived_content(user_ids):
+    """
+    Take the given users' comments and votes out of archived threads, as deleting their rows would.
+
+    Their comments leave the blobs and other people's replies to them become
+    top-level (the SET_NULL cascade); frozen scores drop their votes. The
+    threads stay archived. Returns (comments removed, replies detached).
+    """
+    user_ids = set(user_ids)
+    removed = detached = 0
+    archives = ArchivedThread.objects.filter(Q(participants__in=user_ids) | Q(question__votes__user__in=user_ids))
+    for question_id in list(archives.values_list('question_id', flat=True).distinct()):
+        with transaction.atomic():
+            archive = ArchivedThread.objects.select_for_update().get(question_id=question_id)
+            rows = archived_comment_rows(archive)
+            gone = {row['id'] for row in rows if row['author_id'] in user_ids}
+            kept = [row for row in rows if row['id'] not in gone]
+            for row in kept:
+                if row['parent_id'] in gone:
+                    row['parent_id'] = None
+                    detached += 1
+            archive.comments_blob = _pack(kept)
+            archive.comments_count = len(kept)
+            archive.score = Vote.objects.filter(question_id=question_id).exclude(user__in=user_ids).count()
+            archive.save(update_fields=['comments_blob', 'comments_count', 'score'])
+            archive.participants.remove(*user_ids)
+        removed += len(gone)
+    return removed, detached
+
+
+def rebuild_participants():
+    """Refill every archive's participants from its blob (they are not part of forum dumps)."""
+    Participant = ArchivedThread.participants.through
+    for archive in ArchivedThread.objects.iterator(chunk_size=100):
+        author_ids = {row['author_id'] for row in archived_comment_rows(archive)}
+        Participant.objects.bulk_create(
+            [Participant(archivedthread_id=archive.pk, user_id=author_id) for author_id in author_ids],
+            ignore_conflicts=True,
+        )
+
+
+def unarchive_question(question):
+    """Put an archived thread's comments back with their original ids and timestamps."""
+    archive = ArchivedThread.objects.get(question=question)
+    rows = archived_comment_rows(archive)
+    comments = [
+        Comment(
+            id=row['id'],
+            question_id=question.pk,
+            parent_id=row['parent_id'],
+            author_id=row['author_id'],
+            body=row['body'],
+            body_html=row['body_html'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments, batch_size=500)
+        # auto_now/auto_now_add stamped the inserts; put the archived times back without touching the
+        # shared model fields, which other requests in this process are using.
+        for comment, row in zip(comments, rows):
+            comment.created_at = row['created_at']
+            comment.updated_at = row['updated_at']
+        Comment.objects.bulk_update(comments, ['created_at', 'updated_at'], batch_size=500)
+        archive.delete()
+    return len(rows)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .compression import gzip_variant
+
+FRONT_PAGE_VERSION_KEY = 'front_page:version'
+
+
+def _front_page_version():
+    return cache.get_or_set(FRONT_PAGE_VERSION_KEY, 1, None)
+
+
+def _front_page_key(sort):
+    # Entries are (content, gzip_content) pairs; the suffix keeps them apart from older plain-bytes entries.
+    # Every sort but "new" renders the hot page, so other values must not get entries of their own.
+    sort = 'new' if sort == 'new' else 'hot'
+    return f"front_page:{_front_page_version()}:{sort}:pair"
+
+
+def get_front_page(sort):
+    """The cached ``(content, gzip_content)`` pair for a front-page sort, or None."""
+    return cache.get(_front_page_key(sort))
+
+
+def set_front_page(sort, content):
+    """Cache the rendered page with its gzip variant, so hits never compress it again."""
+    entry = (content, gzip_variant(content))
+    cache.set(_front_page_key(sort), entry, settings.FRONT_PAGE_CACHE_SECONDS)
+    return entry
+
+
+def invalidate_front_page():
+    try:
+        cache.incr(FRONT_PAGE_VERSION_KEY)
+    except ValueError:
+        cache.set(FRONT_PAGE_VERSION_KEY, 1, None)
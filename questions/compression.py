@@ -0,0 +1,108 @@
+import secrets
+import zlib
+from gzip import GzipFile
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_string
+
+
+def accepts_gzip(request):
+    """Whether Accept-Encoding allows gzip, honouring ``q=0`` and ``*``."""
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[coding] = quality
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+    return content_type in settings.COMPRESSIBLE_CONTENT_TYPES
+
+
+def gzip_variant(content):
+    """gzip bytes to cache next to ``content``, or None when compressing would not pay off."""
+    if len(content) < settings.COMPRESSION_MIN_BYTES:
+        return None
+    compressed = compress_string(content, max_random_bytes=GZipMiddleware.max_random_bytes)
+    return compressed if len(compressed) < len(content) else None
+
+
+def _random_filename(max_random_bytes):
+    # Varies the compressed length like Django's own gzip, as a BREACH mitigation.
+    return secrets.token_hex(secrets.randbelow(max_random_bytes // 2) + 1)
+
+
+def flushing_compress_sequence(sequence, max_random_bytes=GZipMiddleware.max_random_bytes):
+    """gzip a streamed body, flushing after every part so each reaches the client as soon as it is produced."""
+    buffer = StreamingBuffer()
+    with GzipFile(filename=_random_filename(max_random_bytes), mode='wb', fileobj=buffer, mtime=0) as stream:
+        yield buffer.read()
+        for part in sequence:
+            stream.write(part)
+            stream.flush(zlib.Z_SYNC_FLUSH)
+            yield buffer.read()
+    yield buffer.read()
+
+
+async def aflushing_compress_sequence(sequence, max_random_bytes=GZipMiddleware.max_random_bytes):
+    buffer = StreamingBuffer()
+    with GzipFile(filename=_random_filename(max_random_bytes), mode='wb', fileobj=buffer, mtime=0) as stream:
+        yield buffer.read()
+        async for part in sequence:
+            stream.write(part)
+            stream.flush(zlib.Z_SYNC_FLUSH)
+            yield buffer.read()
+    yield buffer.read()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    gzip HTML and JSON responses above COMPRESSION_MIN_BYTES.
+
+    Event streams and other content types pass through untouched. A view
+    that already holds compressed bytes for its content (a cached page)
+    sets ``response.gzip_content`` and those are sent instead of
+    compressing again. Streamed pages are flushed part by part.
+    """
+
+    def process_response(self, request, response):
+        if not compressible(response) or response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not accepts_gzip(request):
+            return response
+        if response.streaming:
+            # GZipMiddleware holds streamed output in zlib's buffer; flush per part instead.
+            if response.is_async:
+                response.streaming_content = aflushing_compress_sequence(response.streaming_content)
+            else:
+                response.streaming_content = flushing_compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            precompressed = getattr(response, 'gzip_content', None)
+            if precompressed is None:
+                return super().process_response(request, response)
+            response.content = precompressed
+            response.headers['Content-Length'] = str(len(precompressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,57 @@
+import threading
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+DIRECTORY_VERSION_KEY = 'user_directory:version'
+
+Byline = namedtuple('Byline', ['username', 'is_vip'])
+UNKNOWN_BYLINE = Byline('[deleted]', False)
+
+_lock = threading.Lock()
+_state = {'version': None, 'bylines': {}}
+
+
+def _directory_version():
+    return cache.get_or_set(DIRECTORY_VERSION_KEY, 1, None)
+
+
+def invalidate_directory():
+    """Make every process drop its bylines; they reload lazily on the next lookup."""
+    try:
+        cache.incr(DIRECTORY_VERSION_KEY)
+    except ValueError:
+        cache.set(DIRECTORY_VERSION_KEY, 1, None)
+
+
+def bylines(user_ids):
+    """
+    Map user id -> Byline(username, is_vip) from the in-process directory.
+
+    Only ids not seen since the last invalidation are fetched, in one query,
+    so listings can load ``author_id`` alone instead of joining the user and
+    profile tables on every row.
+    """
+    version = _directory_version()
+    with _lock:
+        if _state['version'] != version:
+            _state.update(version=version, bylines={})
+        known = _state['bylines']
+        missing = {user_id for user_id in user_ids if user_id not in known}
+    loaded = {}
+    if missing:
+        rows = User.objects.filter(pk__in=missing).values_list('pk', 'username', 'profile__is_vip')
+        loaded = {pk: Byline(username, bool(is_vip)) for pk, username, is_vip in rows}
+        with _lock:
+            if _state['version'] == version:
+                _state['bylines'].update(loaded)
+    return {user_id: known.get(user_id) or loaded.get(user_id, UNKNOWN_BYLINE) for user_id in user_ids}
+
+
+def attach_bylines(items):
+    """Set ``item.byline`` on questions or comments from their ``author_id``."""
+    directory = bylines({item.author_id for item in items})
+    for item in items:
+        item.byline = directory[item.author_id]
+    return items
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+FRONT_PAGE_CHANNEL = 'front_page'
+SUBSCRIBER_QUEUE_SIZE = 100
+RESUBSCRIBE_MIN_SECONDS = 0.5
+RESUBSCRIBE_MAX_SECONDS = 30
+
+
+def question_channel(question_id):
+    return f'question:{question_id}'
+
+
+class LocalBroker:
+    """
+    In-process pub/sub for live updates.
+
+    Publishing is thread-safe (signals fire in sync views); each subscriber is
+    an asyncio queue on the event loop, so an idle SSE client costs a queue and
+    a suspended coroutine rather than a thread.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down; it will unsubscribe on its way out.
+                pass
+
+    @staticmethod
+    def _offer(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client drops events rather than holding memory; it can resync from its cursor.
+            metrics.increment('events_dropped_total')
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def subscribe(self, channel, heartbeat=None):
+        """
+        Async iterator over the events published on ``channel`` after this call.
+
+        Yields None after ``heartbeat`` idle seconds so callers can keep the connection alive.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        await self.on_subscribe()
+        metrics.set_gauge('events_subscribers', self.subscriber_count())
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), heartbeat)
+                except TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+            metrics.set_gauge('events_subscribers', self.subscriber_count())
+
+    async def on_subscribe(self):
+        pass
+
+
+class RedisBroker(LocalBroker):
+    """
+    Relays events through Redis pub/sub.
+
+    Each process keeps a single Redis subscription (started with its first
+    SSE client) and fans incoming messages out locally, so client count does
+    not translate into Redis connections.
+    """
+
+    prefix = 'forum-events:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.url = url or settings.REDIS_URL
+        self._listener = None
+        self._client = None
+
+    def _sync_client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def publish(self, channel, event):
+        try:
+            self._sync_client().publish(self.prefix + channel, json.dumps(event))
+        except Exception:
+            logger.exception('Could not publish %s event; delivering locally only', channel)
+            self.deliver(channel, event)
+
+    async def on_subscribe(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        # Redis going away must not silence live updates until a restart: resubscribe with backoff.
+        loop = asyncio.get_running_loop()
+        delay = RESUBSCRIBE_MIN_SECONDS
+        while True:
+            started = loop.time()
+            try:
+                await self._relay()
+            except Exception:
+                logger.exception('Redis event subscription failed')
+            else:
+                logger.warning('Redis event subscription ended')
+            if loop.time() - started > RESUBSCRIBE_MAX_SECONDS:
+                # The subscription was healthy for a while; start backing off from scratch.
+                delay = RESUBSCRIBE_MIN_SECONDS
+            metrics.increment('events_resubscribes_total')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_SECONDS)
+
+    async def _relay(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(self.prefix + '*')
+            async for message in pubsub.listen():
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                self.deliver(channel.removeprefix(self.prefix), json.loads(message['data']))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=1)
+def get_broker():
+    return import_string(settings.EVENTS_BACKEND)()
+
+
+def publish(channel, event):
+    """Publish once the surrounding transaction commits, so subscribers can read what the event refers to."""
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, OperationalError, connections
+from django.http import HttpResponse
+
+from . import metrics
+from .compression import gzip_variant
+from .warmup import anonymous_request
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class DatabaseDeadlineExceeded(OperationalError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-process breaker around page rendering.
+
+    CIRCUIT_FAILURE_THRESHOLD failures in a row open it: pages with a
+    last-known-good copy are then served from the cache without touching the
+    database. After CIRCUIT_RESET_SECONDS it is half-open and lets one
+    background refresh through as a trial, whose outcome closes or re-opens it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < settings.CIRCUIT_RESET_SECONDS:
+            return 'open'
+        return 'half_open'
+
+    def allow_request(self):
+        return self.state() == 'closed'
+
+    def start_trial(self):
+        with self._lock:
+            if self.state() != 'half_open' or self.trial_running:
+                return False
+            self.trial_running = True
+        self._publish()
+        return True
+
+    def cancel_trial(self):
+        with self._lock:
+            self.trial_running = False
+        self._publish()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+        self._publish()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= settings.CIRCUIT_FAILURE_THRESHOLD:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge('db_circuit_state', CIRCUIT_STATES[self.state()])
+        metrics.set_gauge('db_circuit_failures', self.failures)
+
+
+breaker = CircuitBreaker()
+
+
+@contextmanager
+def db_deadline(seconds, using='default'):
+    """
+    Fail the block's queries with DatabaseDeadlineExceeded once ``seconds`` have passed.
+
+    Queries are refused once the budget is spent, and a single slow statement
+    is cut short by the server: statement_timeout on Postgres, a progress
+    handler on SQLite.
+    """
+    connection = connections[using]
+    deadline = time.monotonic() + seconds
+    state = {'timeout_set': False}
+
+    def remaining():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise DatabaseDeadlineExceeded(f'Database deadline of {seconds}s exceeded.')
+        return left
+
+    def enforce(execute, sql, params, many, context):
+        left = remaining()
+        if connection.vendor == 'postgresql' and not state['timeout_set']:
+            state['timeout_set'] = True
+            execute('SET statement_timeout = %s', [max(int(left * 1000), 1)], False, context)
+        return execute(sql, params, many, context)
+
+    progress_handler = None
+    if connection.vendor == 'sqlite':
+        connection.ensure_connection()
+        progress_handler = connection.connection.set_progress_handler
+        progress_handler(lambda: time.monotonic() > deadline, 10_000)
+    try:
+        with connection.execute_wrapper(enforce):
+            yield
+    finally:
+        if progress_handler is not None:
+            progress_handler(None, 0)
+        if state['timeout_set']:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET statement_timeout')
+            except DatabaseError:
+                # Never hand a persistent connection with a short timeout to the next request.
+                connection.close()
+
+
+def _stale_key(key):
+    return f'stale:{key}'
+
+
+def remember(key, content, gzip_content=None):
+    """Keep ``content`` as the last known good copy of a page."""
+    entry = (content, gzip_content or gzip_variant(content), time.time())
+    cache.set(_stale_key(key), entry, settings.STALE_CACHE_SECONDS)
+
+
+def stale_response(key):
+    entry = cache.get(_stale_key(key))
+    if entry is None:
+        return None
+    content, gzip_content, stored_at = entry
+    response = HttpResponse(content)
+    response.gzip_content = gzip_content
+    response['Warning'] = '110 - "Response is Stale"'
+    response['X-Stale-Age'] = str(int(time.time() - stored_at))
+    response['Cache-Control'] = 'no-cache'
+    metrics.increment('stale_responses_total', page=key.partition(':')[0])
+    return response
+
+
+def _refresh(key, view, path, query_string, args, kwargs):
+    try:
+        request = anonymous_request(path, query_string)
+        request.stale_fallback = True
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            remember(key, response.content, getattr(response, 'gzip_content', None))
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+        breaker.record_failure()
+        metrics.increment('stale_refreshes_total', result='error')
+    else:
+        breaker.record_success()
+        metrics.increment('stale_refreshes_total', result='ok')
+    finally:
+        cache.delete(f'stale:refreshing:{key}')
+        connections.close_all()
+
+
+def start_refresh(key, view, request, args, kwargs):
+    """Re-render the page in a background thread, once per key at a time across all workers."""
+    if not cache.add(f'stale:refreshing:{key}', 1, settings.CIRCUIT_RESET_SECONDS):
+        return False
+    thread = threading.Thread(
+        target=_refresh,
+        args=(key, view, request.path, request.META.get('QUERY_STRING', ''), args, kwargs),
+        name=f'stale-refresh-{key}',
+        daemon=True,
+    )
+    thread.start()
+    return True
+
+
+def serve_stale_on_db_failure(page_key):
+    """
+    Keep a last-known-good copy of an anonymous page and fall back to it when the database fails.
+
+    ``page_key(request, *args, **kwargs)`` names the page, or returns None for
+    requests that must always be rendered (logged-in users, POSTs, ...).
+    Rendering runs under DB_DEADLINE_SECONDS; a deadline or database error
+    serves the stale copy, marked with a ``Warning: 110`` header, and starts
+    one background refresh. Such requests carry ``request.stale_fallback``,
+    and views must not stream them: every query has to run before the
+    response leaves, while a failure can still be answered with the copy.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = page_key(request, *args, **kwargs)
+            if key is None:
+                return view(request, *args, **kwargs)
+            if not breaker.allow_request():
+                response = stale_response(key)
+                if response is not None:
+                    if breaker.start_trial() and not start_refresh(key, view, request, args, kwargs):
+                        breaker.cancel_trial()
+                    return response
+            request.stale_fallback = True
+            try:
+                with db_deadline(settings.DB_DEADLINE_SECONDS):
+                    response = view(request, *args, **kwargs)
+            except DatabaseError as exc:
+                breaker.record_failure()
+                reason = 'deadline' if isinstance(exc, DatabaseDeadlineExceeded) else 'error'
+                metrics.increment('db_page_failures_total', reason=reason)
+                response = stale_response(key)
+                if response is None:
+                    raise
+                logger.warning("Serving stale %s after database %s: %s", key, reason, exc)
+                start_refresh(key, view, request, args, kwargs)
+                return response
+            breaker.record_success()
+            # Refresh the stored copy at most every STALE_REMEMBER_SECONDS per page.
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and cache.add(f'stale:remembered:{key}', 1, settings.STALE_REMEMBER_SECONDS)
+            ):
+                remember(key, response.content, getattr(response, 'gzip_content', None))
+            return response
+
+        return wrapped
+
+    return decorator
@@ -4,7 +4,7 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 
-from .models import Comment, Question
+from .models import Comment, DigestFrequency, Question
 
 
 class QuestionForm(forms.ModelForm):
@@ -72,6 +72,11 @@ class ProfileSettingsForm(forms.Form):
         widget=forms.EmailInput(attrs={'placeholder': 'you@example.com'}),
     )
     notify_new_posts = forms.BooleanField(required=False, label='New posts')
+    new_posts_frequency = forms.ChoiceField(
+        required=False,
+        choices=DigestFrequency.choices,
+        label='New post emails',
+    )
     notify_replies_to_comments = forms.BooleanField(required=False, label='New replies to your comments')
     notify_replies_to_posts = forms.BooleanField(required=False, label='New replies to your posts')
 
@@ -82,6 +87,7 @@ class ProfileSettingsForm(forms.Form):
         kwargs['initial'] = initial
         initial.setdefault('email', user.email)
         initial.setdefault('notify_new_posts', profile.notify_new_posts)
+        initial.setdefault('new_posts_frequency', profile.new_posts_frequency)
         initial.setdefault('notify_replies_to_comments', profile.notify_replies_to_comments)
         initial.setdefault('notify_replies_to_posts', profile.notify_replies_to_posts)
         super().__init__(*args, **kwargs)
@@ -90,12 +96,28 @@ class ProfileSettingsForm(forms.Form):
         self.user.email = self.cleaned_data['email']
         self.user.save(update_fields=['email'])
         self.profile.notify_new_posts = self.cleaned_data['notify_new_posts']
+        self.profile.new_posts_frequency = self.cleaned_data['new_posts_frequency'] or DigestFrequency.IMMEDIATE
         self.profile.notify_replies_to_comments = self.cleaned_data['notify_replies_to_comments']
         self.profile.notify_replies_to_posts = self.cleaned_data['notify_replies_to_posts']
         self.profile.save(
             update_fields=[
                 'notify_new_posts',
+                'new_posts_frequency',
                 'notify_replies_to_comments',
                 'notify_replies_to_posts',
             ]
         )
+
+
+class MoveCommentsForm(forms.Form):
+    target = forms.IntegerField(
+        label='Target question id',
+        min_value=1,
+        help_text='The selected comments (and their reply chains) are moved under this question.',
+    )
+
+    def clean_target(self):
+        target = Question.objects.filter(pk=self.cleaned_data['target']).first()
+        if target is None:
+            raise ValidationError('No question with this id.')
+        return target
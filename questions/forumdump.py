@@ -0,0 +1,96 @@
+import base64
+import datetime
+import gzip
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .models import ArchivedThread, Comment, Profile, Question, Vote, render_body
+
+# Dump order; every model only references models before it (and comments their
+# parents, which are exported in id order so they precede their replies).
+# Archive participants are not dumped; import_forum rebuilds them from the blobs.
+FORUM_MODELS = (User, Profile, Question, Comment, Vote, ArchivedThread)
+USER_FIELDS = (
+    'id',
+    'username',
+    'email',
+    'password',
+    'first_name',
+    'last_name',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+    'date_joined',
+    'last_login',
+)
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def dump_fields(model):
+    if model is User:
+        return USER_FIELDS
+    return tuple(field.attname for field in model._meta.concrete_fields)
+
+
+def open_dump(path, mode):
+    """Open a dump for text reading or writing; ``.gz`` paths (or gzip content when reading) are compressed."""
+    if mode == 'w':
+        if str(path).endswith('.gz'):
+            return gzip.open(path, 'wt', encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+    with open(path, 'rb') as handle:
+        compressed = handle.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds datetimes to milliseconds; keep them exact so
+        # reloaded rows sort and paginate the same as the originals.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        # Binary columns (archive blobs) as base64, which BinaryField.to_python decodes.
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(o).decode('ascii')
+        return super().default(o)
+
+
+def dump_line(model, row):
+    return json.dumps({'model': model_label(model), 'fields': row}, cls=DumpEncoder, separators=(',', ':'))
+
+
+def build_instance(model, fields):
+    """Turn a dumped row back into an unsaved instance, converting values the JSON encoder stringified."""
+    values = {}
+    for name, value in fields.items():
+        field = model._meta.get_field(name)
+        values[field.attname] = field.to_python(value) if value is not None and not field.is_relation else value
+    if hasattr(model, 'rendered_body') and not values.get('body_html') and values.get('body'):
+        values['body_html'] = render_body(values['body'])
+    return model(**values)
+
+
+@contextmanager
+def preserved_timestamps(models_):
+    """Stop auto_now/auto_now_add from overwriting imported timestamps during bulk_create."""
+    switched = []
+    for model in models_:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add):
+                switched.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in switched:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
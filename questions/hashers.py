@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _hashing_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS,
+                    thread_name_prefix='password-hashing',
+                )
+    return _executor
+
+
+def run_hashing(func, *args, **kwargs):
+    """Run a CPU-heavy hashing call on the bounded pool and wait for its result."""
+    return _hashing_executor().submit(func, *args, **kwargs).result()
+
+
+class BoundedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 using settings.PBKDF2_ITERATIONS, computed on a small shared pool.
+
+    Every hash, whether for signup, login or a password re-check, goes through
+    encode(), so a burst of them queues on PASSWORD_HASHING_WORKERS threads
+    instead of taking every CPU the request threads could use. Stored hashes
+    with another iteration count are upgraded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        return run_hashing(super().encode, password, salt, iterations)
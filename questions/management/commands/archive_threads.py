@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from questions.archive import archive_stale_threads
+from questions.caching import invalidate_front_page
+
+
+class Command(BaseCommand):
+    help = "Move the comments of threads with no activity for N months into compressed archive rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=12,
+            help="Archive threads older than this with no comment edits or votes since.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Candidate threads fetched per query.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Stop after archiving this many threads.",
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_stale_threads(options["months"], batch_size=options["batch_size"], limit=options["limit"])
+        if archived:
+            invalidate_front_page()
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} threads."))
@@ -0,0 +1,98 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from questions.sqlite.base import WRITER_LOCK
+
+SCHEMA = (
+    "CREATE TABLE vote ("
+    " id INTEGER PRIMARY KEY,"
+    " question_id INTEGER NOT NULL,"
+    " user_id INTEGER NOT NULL,"
+    " created_at TEXT NOT NULL,"
+    " UNIQUE (question_id, user_id))"
+)
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent vote throughput on SQLite with its defaults and with the tuned production mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent voters.")
+        parser.add_argument("--votes", type=int, default=200, help="Vote toggles per voter.")
+        parser.add_argument("--questions", type=int, default=20, help="Questions the votes are spread over.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ("defaults", "tuned"):
+                path = Path(directory) / f"{mode}.sqlite3"
+                committed, errors, elapsed = self.run_mode(mode, path, options)
+                line = (
+                    f"{mode:>8}: {committed} votes in {elapsed:.2f}s "
+                    f"({committed / elapsed:.0f} votes/s), {errors} 'database is locked' errors"
+                )
+                self.stdout.write(self.style.SUCCESS(line) if not errors else self.style.WARNING(line))
+
+    def connect(self, mode, path):
+        # Mirrors Django's connection setup: autocommit, explicit BEGIN for atomic blocks.
+        connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if mode == "tuned":
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                connection.execute(f"PRAGMA {name}={value}")
+        return connection
+
+    def run_mode(self, mode, path, options):
+        setup = self.connect(mode, path)
+        setup.execute(SCHEMA)
+        setup.close()
+        begin = "BEGIN IMMEDIATE" if mode == "tuned" else "BEGIN"
+        totals = {"committed": 0, "errors": 0}
+        totals_lock = threading.Lock()
+        start_barrier = threading.Barrier(options["threads"])
+
+        def voter(user_id):
+            connection = self.connect(mode, path)
+            committed = errors = 0
+            start_barrier.wait()
+            for index in range(options["votes"]):
+                question_id = (user_id * 7 + index) % options["questions"]
+                # The tuned backend queues a process's writers on WRITER_LOCK; the stock one does not.
+                with WRITER_LOCK if mode == "tuned" else nullcontext():
+                    try:
+                        connection.execute(begin)
+                        exists = connection.execute(
+                            "SELECT 1 FROM vote WHERE question_id = ? AND user_id = ?", (question_id, user_id)
+                        ).fetchone()
+                        if exists:
+                            connection.execute(
+                                "DELETE FROM vote WHERE question_id = ? AND user_id = ?", (question_id, user_id)
+                            )
+                        else:
+                            connection.execute(
+                                "INSERT INTO vote (question_id, user_id, created_at) VALUES (?, ?, datetime('now'))",
+                                (question_id, user_id),
+                            )
+                        connection.execute("COMMIT")
+                        committed += 1
+                    except sqlite3.OperationalError:
+                        if connection.in_transaction:
+                            connection.execute("ROLLBACK")
+                        errors += 1
+            connection.close()
+            with totals_lock:
+                totals["committed"] += committed
+                totals["errors"] += errors
+
+        threads = [threading.Thread(target=voter, args=(user_id,)) for user_id in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals["committed"], totals["errors"], time.perf_counter() - started
@@ -0,0 +1,77 @@
+import heapq
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from questions.validators import (
+    BUNDLED_PASSWORD_LIST_PATH,
+    PASSWORD_DIGEST_SIZE,
+    password_digest,
+    read_password_source,
+)
+
+
+def _read_run(path):
+    with open(path, 'rb') as handle:
+        while record := handle.read(PASSWORD_DIGEST_SIZE):
+            yield record
+
+
+class Command(BaseCommand):
+    help = "Build the sorted, memory-mappable common-password list used at signup."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sources",
+            nargs="*",
+            help="Plain-text or .gz password lists, one per line. Defaults to Django's bundled list.",
+        )
+        parser.add_argument(
+            "--output",
+            default=settings.COMMON_PASSWORD_LIST_PATH,
+            help="Where to write the binary list.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1_000_000,
+            help="Digests sorted in memory at a time; larger lists are merged from sorted runs on disk.",
+        )
+
+    def handle(self, *args, **options):
+        sources = options["sources"] or [BUNDLED_PASSWORD_LIST_PATH]
+        output = Path(options["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            runs = []
+            chunk = set()
+
+            def flush():
+                run_path = Path(workdir) / f"run-{len(runs)}"
+                run_path.write_bytes(b"".join(sorted(chunk)))
+                runs.append(run_path)
+                chunk.clear()
+
+            for source in sources:
+                for password in read_password_source(source):
+                    chunk.add(password_digest(password))
+                    if len(chunk) >= options["chunk_size"]:
+                        flush()
+            if chunk:
+                flush()
+
+            count = 0
+            previous = None
+            partial = output.with_name(output.name + ".tmp")
+            with open(partial, "wb") as handle:
+                for record in heapq.merge(*(_read_run(run) for run in runs)):
+                    if record != previous:
+                        handle.write(record)
+                        previous = record
+                        count += 1
+            partial.replace(output)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} password digests to {output}."))
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from questions.snapshots import build_snapshots, snapshot_root
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Render archived threads to static HTML (plus .gz) under SNAPSHOT_ROOT for nginx to serve to anonymous readers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", help="Snapshot directory; defaults to SNAPSHOT_ROOT.")
+        parser.add_argument("--full", action="store_true", help="Render every snapshot again, even unchanged ones.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Keep running and resync every this many seconds.",
+        )
+
+    def handle(self, *args, **options):
+        root = options["root"] or snapshot_root()
+        if root is None:
+            raise CommandError("Set SNAPSHOT_ROOT or pass --root.")
+        full = options["full"]
+        while True:
+            try:
+                written, removed, unchanged = build_snapshots(root, full=full)
+            except Exception:
+                if options["interval"] is None:
+                    raise
+                logger.exception("Snapshot build failed")
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Wrote {written} snapshots, removed {removed}, {unchanged} unchanged.")
+                )
+            if options["interval"] is None:
+                return
+            full = False
+            connections.close_all()
+            time.sleep(options["interval"])
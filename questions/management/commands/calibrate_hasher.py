@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+# OWASP's current floor for PBKDF2-HMAC-SHA256.
+MIN_RECOMMENDED_ITERATIONS = 600_000
+
+
+class Command(BaseCommand):
+    help = "Benchmark PBKDF2 on this machine and suggest PASSWORD_HASHER_ITERATIONS for a target hash time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=250.0,
+            help="Desired time for a single password hash, in milliseconds.",
+        )
+        parser.add_argument(
+            "--probe-iterations",
+            type=int,
+            default=100_000,
+            help="Iteration count used for each timing sample.",
+        )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=5,
+            help="Number of timing samples; the fastest one is used.",
+        )
+
+    def handle(self, *args, **options):
+        hasher = get_hasher("default")
+        salt = hasher.salt()
+        probe = options["probe_iterations"]
+        timings = []
+        for _ in range(max(options["samples"], 1)):
+            started = time.perf_counter()
+            hasher.encode("calibration-password", salt, probe)
+            timings.append(time.perf_counter() - started)
+        per_iteration = min(timings) / probe
+        suggested = max(int(options["target_ms"] / 1000 / per_iteration) // 10_000 * 10_000, 10_000)
+        current_ms = per_iteration * settings.PBKDF2_ITERATIONS * 1000
+
+        self.stdout.write(f"{probe} iterations: {min(timings) * 1000:.1f} ms")
+        self.stdout.write(f"Current setting ({settings.PBKDF2_ITERATIONS} iterations): ~{current_ms:.0f} ms per hash")
+        self.stdout.write(self.style.SUCCESS(
+            f"PASSWORD_HASHER_ITERATIONS={suggested} (~{options['target_ms']:.0f} ms per hash)"
+        ))
+        if suggested < MIN_RECOMMENDED_ITERATIONS:
+            self.stdout.write(self.style.WARNING(
+                f"This is below the recommended minimum of {MIN_RECOMMENDED_ITERATIONS} iterations; "
+                "consider a higher target or more CPU for the pod."
+            ))
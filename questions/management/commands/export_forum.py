@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from questions.forumdump import FORUM_MODELS, dump_fields, dump_line, model_label, open_dump
+
+
+class Command(BaseCommand):
+    help = "Stream users, profiles, questions, comments, votes and thread archives to a JSONL file (gzip when it ends in .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Destination file, or - for stdout.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        handle = sys.stdout if output == "-" else open_dump(output, "w")
+        counts = {}
+        try:
+            for model in FORUM_MODELS:
+                rows = model._default_manager.order_by("pk").values(*dump_fields(model))
+                count = 0
+                for row in rows.iterator(chunk_size=options["chunk_size"]):
+                    handle.write(dump_line(model, row))
+                    handle.write("\n")
+                    count += 1
+                counts[model_label(model)] = count
+        finally:
+            if handle is not sys.stdout:
+                handle.close()
+        summary = ", ".join(f"{count} {label}" for label, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f"Exported {summary}."))
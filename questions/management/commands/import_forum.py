@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from questions.archive import rebuild_participants
+from questions.caching import invalidate_front_page
+from questions.forumdump import FORUM_MODELS, build_instance, model_label, open_dump, preserved_timestamps
+
+MODELS_BY_LABEL = {model_label(model): model for model in FORUM_MODELS}
+
+
+class Command(BaseCommand):
+    help = "Load a dump written by export_forum into an empty database, keeping primary keys and timestamps."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="JSONL dump, plain or gzip-compressed.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows inserted per bulk_create.",
+        )
+
+    def handle(self, *args, **options):
+        populated = [model_label(model) for model in FORUM_MODELS if model._default_manager.exists()]
+        if populated:
+            raise CommandError(f"Refusing to import into a database that already has rows in: {', '.join(populated)}.")
+
+        chunk_size = options["chunk_size"]
+        counts = dict.fromkeys(MODELS_BY_LABEL, 0)
+        chunk = []
+        chunk_model = None
+
+        def flush():
+            if chunk:
+                # bulk_create sends no signals, so no notifications or cache churn per row.
+                chunk_model._default_manager.bulk_create(chunk, batch_size=chunk_size)
+                counts[model_label(chunk_model)] += len(chunk)
+                chunk.clear()
+
+        # One transaction: foreign keys are checked at commit, and a failed import leaves nothing behind.
+        with transaction.atomic(), preserved_timestamps(FORUM_MODELS), open_dump(options["input"], "r") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    model = MODELS_BY_LABEL[record["model"]]
+                except (ValueError, KeyError) as exc:
+                    raise CommandError(f"Line {line_number}: not a forum dump record ({exc}).") from exc
+                if model is not chunk_model:
+                    flush()
+                    chunk_model = model
+                chunk.append(build_instance(model, record["fields"]))
+                if len(chunk) >= chunk_size:
+                    flush()
+            flush()
+            rebuild_participants()
+            with connection.cursor() as cursor:
+                for statement in connection.ops.sequence_reset_sql(no_style(), FORUM_MODELS):
+                    cursor.execute(statement)
+
+        invalidate_front_page()
+        summary = ", ".join(f"{count} {label}" for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}."))
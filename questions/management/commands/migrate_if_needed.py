@@ -0,0 +1,103 @@
+import fcntl
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+# Arbitrary but stable key shared by every replica taking the Postgres advisory lock.
+ADVISORY_LOCK_KEY = 7_301_926_417
+
+
+def _pending_migrations(connection):
+    executor = MigrationExecutor(connection)
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+@contextmanager
+def _postgres_lock(connection, timeout):
+    deadline = time.monotonic() + timeout
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [ADVISORY_LOCK_KEY])
+            if cursor.fetchone()[0]:
+                break
+            if time.monotonic() >= deadline:
+                raise CommandError("Timed out waiting for the migration lock.")
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [ADVISORY_LOCK_KEY])
+
+
+@contextmanager
+def _sqlite_lock(database_path, timeout):
+    lock_path = Path(f"{database_path}.migrate.lock")
+    deadline = time.monotonic() + timeout
+    with open(lock_path, 'w') as lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise CommandError("Timed out waiting for the migration lock.")
+                time.sleep(1)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _migration_lock(connection, timeout):
+    if connection.vendor == 'postgresql':
+        with _postgres_lock(connection, timeout):
+            yield
+        return
+    database_path = Path(str(connection.settings_dict['NAME']))
+    if connection.vendor == 'sqlite' and database_path.parent.is_dir() and not connection.is_in_memory_db():
+        with _sqlite_lock(database_path, timeout):
+            yield
+        return
+    yield
+
+
+class Command(BaseCommand):
+    help = "Apply migrations only when the migration plan is not empty."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to check and migrate.",
+        )
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            default=300,
+            help="Seconds to wait for another replica to finish migrating.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not _pending_migrations(connection):
+            self.stdout.write("No migrations to apply.")
+            return
+
+        with _migration_lock(connection, options["lock_timeout"]):
+            # Another replica may have applied the plan while we were waiting for the lock.
+            if not _pending_migrations(connection):
+                self.stdout.write("Migrations were applied by another process.")
+                return
+            call_command(
+                "migrate",
+                database=options["database"],
+                interactive=False,
+                verbosity=options["verbosity"],
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from questions.purge import DEFAULT_BATCH_SIZE, purge_pending_accounts
+
+
+class Command(BaseCommand):
+    help = "Purge the content of deactivated accounts queued for deletion, in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Maximum number of rows removed per statement.",
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_pending_accounts(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} accounts."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from questions.models import DigestFrequency
+from questions.notifications import send_new_post_digests
+
+
+class Command(BaseCommand):
+    help = "Send daily or weekly new-post digests to subscribers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--frequency",
+            choices=[DigestFrequency.DAILY, DigestFrequency.WEEKLY],
+            default=DigestFrequency.DAILY,
+            help="Which digest subscribers to send to; the window matches the frequency.",
+        )
+
+    def handle(self, *args, **options):
+        sent = send_new_post_digests(options["frequency"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} {options['frequency']} digests."))
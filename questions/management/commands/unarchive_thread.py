@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questions.archive import unarchive_question
+from questions.caching import invalidate_front_page
+from questions.models import Question
+
+
+class Command(BaseCommand):
+    help = "Restore archived threads to live comments, keeping comment ids and timestamps."
+
+    def add_arguments(self, parser):
+        parser.add_argument("question_ids", nargs="+", type=int, help="Ids of the archived questions.")
+
+    def handle(self, *args, **options):
+        questions = Question.objects.filter(pk__in=options["question_ids"], archive__isnull=False)
+        missing = set(options["question_ids"]) - {question.pk for question in questions}
+        if missing:
+            raise CommandError(f"Not archived: {', '.join(str(pk) for pk in sorted(missing))}.")
+        restored = sum(unarchive_question(question) for question in questions)
+        invalidate_front_page()
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} comments."))
@@ -0,0 +1,43 @@
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def _series(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    key = _series(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_series(name, labels)] = value
+
+
+def _format_series(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{value_}"' for key, value_ in labels)
+        return f'{name}{{{rendered}}} {value}'
+    return f'{name} {value}'
+
+
+def render_prometheus():
+    """Render this process's counters and gauges in the Prometheus text format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        declared = set()
+        for (name, labels), value in series:
+            if name not in declared:
+                lines.append(f'# TYPE {name} {kind}')
+                declared.add(name)
+            lines.append(_format_series(name, labels, value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_profile_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['pinned', 'created_at', 'id'], name='question_new_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0012_question_new_feed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='new_posts_frequency',
+            field=models.CharField(choices=[('immediate', 'Immediately'), ('daily', 'Daily digest'), ('weekly', 'Weekly digest')], default='immediate', max_length=10),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:38
+
+from django.db import migrations, models
+
+# Expressions match SearchVector(field, config='english') in the admin search, so the planner can use them.
+SEARCH_INDEXES = [
+    ('questions_question_title_search', 'questions_question', 'title'),
+    ('questions_comment_body_search', 'questions_comment', 'body'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING gin (to_tsvector('english'::regconfig, COALESCE({column}, '')))"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0014_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
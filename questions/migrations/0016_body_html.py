@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:41
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+
+BATCH_SIZE = 1000
+
+
+def backfill_body_html(apps, schema_editor):
+    for model_name in ('Question', 'Comment'):
+        model = apps.get_model('questions', model_name)
+        last_pk = 0
+        while True:
+            batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'body')[:BATCH_SIZE])
+            if not batch:
+                break
+            for row in batch:
+                row.body_html = str(linebreaksbr(row.body, autoescape=True))
+            model.objects.bulk_update(batch, ['body_html'])
+            last_pk = batch[-1].pk
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own instead of holding one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('questions', '0015_comment_created_at_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_body_html, noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill_updated_at(apps, schema_editor):
+    Comment = apps.get_model('questions', 'Comment')
+    last_pk = 0
+    while True:
+        pks = list(Comment.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        Comment.objects.filter(pk__in=pks).update(updated_at=models.F('created_at'))
+        last_pk = pks[-1]
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('questions', '0016_body_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['question', 'updated_at', 'id'], name='comment_thread_updates_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0018_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(db_index=True, max_length=16)),
+                ('sql', models.TextField()),
+                ('params_count', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.FloatField()),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('call_site', models.CharField(blank=True, max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0019_slowquery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedThread',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='questions.question')),
+                ('comments_blob', models.BinaryField()),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('participants', models.ManyToManyField(blank=True, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
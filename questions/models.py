@@ -1,18 +1,50 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.template.defaultfilters import linebreaksbr
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 
-class Question(models.Model):
+from .caching import invalidate_front_page
+
+
+def render_body(text):
+    """Escaped HTML for a post body, as the templates used to render it with linebreaksbr."""
+    return str(linebreaksbr(text, autoescape=True))
+
+
+class RenderedBodyMixin:
+    """Keeps body_html in step with body on save; rows written in bulk are rendered on read."""
+
+    def _sync_body_html(self, kwargs):
+        self.body_html = render_body(self.body)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'body' in update_fields and 'body_html' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'body_html']
+
+    @property
+    def rendered_body(self):
+        if not self.body_html and self.body:
+            return mark_safe(render_body(self.body))
+        return mark_safe(self.body_html)
+
+
+class Question(RenderedBodyMixin, models.Model):
     title = models.CharField(max_length=180)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     body = models.TextField(blank=True)
+    body_html = models.TextField(blank=True, editable=False)
     link = models.URLField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='questions')
     pinned = models.BooleanField(default=False, db_index=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['pinned', 'created_at', 'id'], name='question_new_feed_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.title) or "question"
@@ -22,6 +54,7 @@ class Question(models.Model):
                 counter += 1
                 slug = f"{base_slug}-{counter}"
             self.slug = slug
+        self._sync_body_html(kwargs)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -42,21 +75,67 @@ class Vote(models.Model):
         return f'{self.user.username} upvoted {self.question.title}'
 
 
-class Comment(models.Model):
+class Comment(RenderedBodyMixin, models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='replies', null=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     body = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    body_html = models.TextField(blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['question', 'updated_at', 'id'], name='comment_thread_updates_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self._sync_body_html(kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.author.username} on {self.question.title}'
 
 
+class ArchivedThread(models.Model):
+    """
+    A quiet old thread moved out of the comment table.
+
+    The comment tree lives in ``comments_blob`` (zlib-compressed JSON, see
+    questions/archive.py) and the score is frozen at archive time, so the
+    thread renders from this one row. ``participants`` lets account purges find
+    the archives holding a user's comments.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    comments_blob = models.BinaryField()
+    comments_count = models.PositiveIntegerField(default=0)
+    score = models.PositiveIntegerField(default=0)
+    participants = models.ManyToManyField(User, related_name='+', blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Archive of {self.question.title}'
+
+
+class DigestFrequency(models.TextChoices):
+    IMMEDIATE = 'immediate', 'Immediately'
+    DAILY = 'daily', 'Daily digest'
+    WEEKLY = 'weekly', 'Weekly digest'
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     is_vip = models.BooleanField(default=False, db_index=True)
     notify_new_posts = models.BooleanField(default=False)
+    new_posts_frequency = models.CharField(
+        max_length=10,
+        choices=DigestFrequency.choices,
+        default=DigestFrequency.IMMEDIATE,
+    )
     notify_replies_to_comments = models.BooleanField(default=False)
     notify_replies_to_posts = models.BooleanField(default=False)
 
@@ -64,12 +143,120 @@ class Profile(models.Model):
         return f'{self.user.username} profile'
 
 
+class AccountDeletion(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='deletion',
+        null=True,
+        blank=True,
+    )
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True)
+    votes_deleted = models.PositiveIntegerField(default=0)
+    comments_deleted = models.PositiveIntegerField(default=0)
+    questions_deleted = models.PositiveIntegerField(default=0)
+    replies_detached = models.PositiveIntegerField(default=0)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Deletion of {self.username} ({self.status})'
+
+
+class RequestProfile(models.Model):
+    """One profiled request; only the newest settings.PROFILER_RING_SIZE rows are kept."""
+
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    report = models.JSONField(default=dict)
+    pstats = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+
+class SlowQuery(models.Model):
+    """One statement over settings.SLOW_QUERY_THRESHOLD_MS; only the newest SLOW_QUERY_LOG_SIZE rows are kept."""
+
+    fingerprint = models.CharField(max_length=16, db_index=True)
+    sql = models.TextField()
+    params_count = models.PositiveIntegerField(default=0)
+    duration_ms = models.FloatField()
+    view_name = models.CharField(max_length=200, blank=True)
+    call_site = models.CharField(max_length=300, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return f'{self.duration_ms:.0f} ms {self.sql[:80]}'
+
+
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    from .usercache import forget_users
+
+    forget_users([instance.pk])
+
+
+@receiver(post_save, sender=Profile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    from .usercache import forget_users
+
+    forget_users([instance.user_id])
+
+
+@receiver(pre_delete, sender=User)
+def remove_deleted_user_archived_content(sender, instance, **kwargs):
+    # Archived comments are not rows, so the CASCADE from User cannot reach them.
+    from .archive import remove_archived_content
+
+    remove_archived_content([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def refresh_username_directory(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    from .directory import invalidate_directory
+
+    invalidate_directory()
+
+
+@receiver(post_save, sender=Profile)
+def refresh_vip_directory(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'is_vip' not in update_fields):
+        return
+    from .directory import invalidate_directory
+
+    invalidate_directory()
+
+
+@receiver(post_save, sender=Question)
+def invalidate_front_page_cache(sender, instance, **kwargs):
+    invalidate_front_page()
+
+
 @receiver(post_save, sender=Question)
 def send_new_post_notifications(sender, instance, created, **kwargs):
     if not created:
@@ -86,3 +273,38 @@ def send_reply_notifications(sender, instance, created, **kwargs):
     from .notifications import notify_new_comment
 
     notify_new_comment(instance)
+
+
+@receiver(post_save, sender=Question)
+def publish_new_question(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from .events import FRONT_PAGE_CHANNEL, publish
+
+    publish(FRONT_PAGE_CHANNEL, {'type': 'question', 'id': instance.pk})
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment_change(sender, instance, created, **kwargs):
+    from .events import publish, question_channel
+
+    publish(question_channel(instance.question_id), {'type': 'comments', 'id': instance.pk})
+
+
+@receiver(post_save, sender=Question)
+def discard_edited_snapshot(sender, instance, created, **kwargs):
+    if created:
+        return
+    from .snapshots import discard_snapshot
+
+    discard_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=ArchivedThread)
+@receiver(post_delete, sender=ArchivedThread)
+def discard_changed_archive_snapshot(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    from .snapshots import discard_snapshot
+
+    discard_snapshot(instance.question_id)
@@ -1,15 +1,24 @@
 import json
 import logging
 import socket
+from datetime import timedelta
 from urllib.error import URLError
 from urllib.request import Request, urlopen
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+
+from .models import DigestFrequency, Question
 
 logger = logging.getLogger(__name__)
 
+DIGEST_WINDOWS = {
+    DigestFrequency.DAILY: timedelta(days=1),
+    DigestFrequency.WEEKLY: timedelta(days=7),
+}
+
 
 def _notifications_enabled():
     return bool(getattr(settings, 'EMAIL_NOTIFICATIONS_ENABLED', False) and getattr(settings, 'SMTP2GO_API_KEY', ''))
@@ -51,6 +60,7 @@ def notify_new_question(question):
     recipients = User.objects.select_related('profile').filter(
         is_active=True,
         profile__notify_new_posts=True,
+        profile__new_posts_frequency=DigestFrequency.IMMEDIATE,
     ).exclude(
         pk=question.author_id,
     ).exclude(
@@ -68,6 +78,56 @@ def notify_new_question(question):
         _send_smtp2go_email(recipient.email, subject, body)
 
 
+def send_new_post_digests(frequency, now=None):
+    """
+    Email every digest subscriber the posts published in the last window.
+
+    New posts are fetched once; a digest body is rendered once per distinct
+    set of posts (subscribers only differ by excluding their own posts), so a
+    busy window costs one email per subscriber rather than one per post.
+    """
+    if not _notifications_enabled():
+        return 0
+
+    now = now or timezone.now()
+    questions = list(
+        Question.objects.filter(created_at__gte=now - DIGEST_WINDOWS[frequency], created_at__lt=now)
+        .select_related('author')
+        .only('id', 'title', 'slug', 'created_at', 'author_id', 'author__username')
+        .order_by('created_at')
+    )
+    if not questions:
+        return 0
+
+    recipients = User.objects.filter(
+        is_active=True,
+        profile__notify_new_posts=True,
+        profile__new_posts_frequency=frequency,
+    ).exclude(
+        email='',
+    ).values_list('pk', 'email')
+
+    period = 'today' if frequency == DigestFrequency.DAILY else 'this week'
+    rendered = {}
+    sent = 0
+    for recipient_id, email in recipients.iterator():
+        content = tuple(question for question in questions if question.author_id != recipient_id)
+        if not content:
+            continue
+        if content not in rendered:
+            count = len(content)
+            subject = f"{count} new post{'s' if count != 1 else ''} on Philosofriends {period}"
+            lines = [
+                f"- {question.title}\n  by {question.author.username}: {_question_url(question)}"
+                for question in content
+            ]
+            rendered[content] = (subject, "New posts on Philosofriends:\n\n" + "\n\n".join(lines) + "\n")
+        subject, body = rendered[content]
+        if _send_smtp2go_email(email, subject, body):
+            sent += 1
+    return sent
+
+
 def notify_new_comment(comment):
     if not _notifications_enabled():
         return
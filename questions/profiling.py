@@ -0,0 +1,172 @@
+import cProfile
+import contextvars
+import marshal
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+TOP_FUNCTIONS = 40
+MAX_RECORDED_QUERIES = 500
+
+_recorder = contextvars.ContextVar('profile_recorder', default=None)
+_template_hook_lock = threading.Lock()
+_template_hook_installed = False
+
+
+class _Recorder:
+    def __init__(self):
+        self.queries = []
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.templates = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.sql_count += 1
+            self.sql_seconds += elapsed
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'ms': round(elapsed * 1000, 3),
+                    'many': many,
+                })
+
+    def record_template(self, name, elapsed):
+        entry = self.templates.setdefault(name, {'name': name, 'renders': 0, 'ms': 0.0})
+        entry['renders'] += 1
+        entry['ms'] += elapsed * 1000
+
+
+def _install_template_hook():
+    """
+    Time Template._render for the profiled request only.
+
+    Installed by the first profiled request, so processes that never profile
+    keep the stock method; afterwards the cost for other requests is a single
+    context variable lookup per template.
+    """
+    global _template_hook_installed
+    with _template_hook_lock:
+        if _template_hook_installed:
+            return
+        original = Template._render
+
+        def timed_render(self, context):
+            recorder = _recorder.get()
+            if recorder is None:
+                return original(self, context)
+            start = time.perf_counter()
+            try:
+                return original(self, context)
+            finally:
+                recorder.record_template(self.name or '<string>', time.perf_counter() - start)
+
+        Template._render = timed_render
+        _template_hook_installed = True
+
+
+def _top_functions(stats):
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': pstats.func_std_string(func),
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for func, (_, calls, own, cumulative, _) in rows
+    ]
+
+
+def wants_profile(request):
+    return request.GET.get('__profile', '0') not in ('', '0') or 'HTTP_X_PROFILE' in request.META
+
+
+class ProfilerMiddleware:
+    """
+    Runs a superuser's request under cProfile when it asks with ?__profile=1 or an X-Profile header.
+
+    The report (top functions, SQL with timings, template render times) and the
+    raw pstats data are stored as a RequestProfile and the response carries its
+    id in X-Profile-Id. Other requests only pay for the two lookups in
+    wants_profile(), on whichever side of ASGI they arrive.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not wants_profile(request) or not request.user.is_superuser:
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not wants_profile(request) or not (await request.auser()).is_superuser:
+            return await self.get_response(request)
+        # cProfile follows a thread, so a profiled request runs the rest of the chain in one.
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        _install_template_hook()
+        recorder = _Recorder()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread.
+            return get_response(request)
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = get_response(request)
+        finally:
+            profiler.disable()
+            _recorder.reset(token)
+        duration = time.perf_counter() - start
+        profile = self.save_profile(request, response, profiler, recorder, duration)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def save_profile(self, request, response, profiler, recorder, duration):
+        from .models import RequestProfile
+
+        # pstats.Stats takes the collected data out of the profiler, so keep this one copy.
+        stats = pstats.Stats(profiler).stats
+        profile = RequestProfile.objects.create(
+            path=request.get_full_path()[:500],
+            method=request.method,
+            status_code=response.status_code,
+            user=request.user,
+            duration_ms=duration * 1000,
+            sql_count=recorder.sql_count,
+            sql_ms=recorder.sql_seconds * 1000,
+            report={
+                'functions': _top_functions(stats),
+                'queries': recorder.queries,
+                'templates': sorted(recorder.templates.values(), key=lambda entry: entry['ms'], reverse=True),
+            },
+            pstats=marshal.dumps(stats),
+        )
+        RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILER_RING_SIZE).delete()
+        return profile
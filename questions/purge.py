@@ -0,0 +1,126 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .archive import remove_archived_content
+from .models import AccountDeletion, Comment, Question, Vote
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of primary keys in ascending order, resuming after the last key of each batch."""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def delete_in_batches(queryset, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    total = 0
+    model = queryset.model
+    for pks in _batches(queryset, batch_size):
+        model.objects.filter(pk__in=pks).delete()
+        total += len(pks)
+        if on_batch:
+            on_batch(len(pks))
+    return total
+
+
+def update_in_batches(queryset, batch_size=DEFAULT_BATCH_SIZE, on_batch=None, **values):
+    total = 0
+    model = queryset.model
+    for pks in _batches(queryset, batch_size):
+        model.objects.filter(pk__in=pks).update(**values)
+        total += len(pks)
+        if on_batch:
+            on_batch(len(pks))
+    return total
+
+
+def delete_user_content(user_ids, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Remove the questions, comments and votes of the given users in bounded batches.
+
+    Dependents go first so each batch is a small, self-contained statement:
+    other people's replies to the users' comments are detached (as the
+    SET_NULL cascade would), then votes, the comments under the users'
+    questions, the users' own comments and finally their questions.
+    ``progress(field)`` may return an ``on_batch`` callback per counter.
+    Returns the totals keyed like the AccountDeletion counters.
+    """
+    user_ids = list(user_ids)
+    # Archived threads keep their comments in a blob; the users' rows are stripped from it in place.
+    archived_removed, archived_detached = remove_archived_content(user_ids)
+
+    def on_batch(field):
+        return progress(field) if progress else None
+
+    totals = {
+        'replies_detached': archived_detached + update_in_batches(
+            Comment.objects.filter(parent__author__in=user_ids).exclude(author__in=user_ids),
+            batch_size,
+            on_batch('replies_detached'),
+            parent=None,
+        ),
+    }
+    totals['votes_deleted'] = delete_in_batches(
+        Vote.objects.filter(user__in=user_ids), batch_size, on_batch('votes_deleted')
+    ) + delete_in_batches(
+        Vote.objects.filter(question__author__in=user_ids), batch_size, on_batch('votes_deleted')
+    )
+    totals['comments_deleted'] = archived_removed + delete_in_batches(
+        Comment.objects.filter(question__author__in=user_ids), batch_size, on_batch('comments_deleted')
+    ) + delete_in_batches(
+        Comment.objects.filter(author__in=user_ids), batch_size, on_batch('comments_deleted')
+    )
+    totals['questions_deleted'] = delete_in_batches(
+        Question.objects.filter(author__in=user_ids), batch_size, on_batch('questions_deleted')
+    )
+    return totals
+
+
+def schedule_account_deletion(user):
+    """Deactivate the account now and queue its content for the background purge."""
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    deletion, _ = AccountDeletion.objects.get_or_create(user=user, defaults={'username': user.username})
+    return deletion
+
+
+def _progress(deletion, field):
+    def record(count):
+        AccountDeletion.objects.filter(pk=deletion.pk).update(**{field: F(field) + count})
+
+    return record
+
+
+def purge_account(deletion, batch_size=DEFAULT_BATCH_SIZE):
+    """Remove everything a deleted account owns in bounded batches, then the user row itself."""
+    user = deletion.user
+    if user is None:
+        AccountDeletion.objects.filter(pk=deletion.pk).update(status=AccountDeletion.Status.DONE)
+        return
+    AccountDeletion.objects.filter(pk=deletion.pk).update(status=AccountDeletion.Status.RUNNING)
+
+    delete_user_content([user.pk], batch_size, lambda field: _progress(deletion, field))
+
+    user.delete()
+    AccountDeletion.objects.filter(pk=deletion.pk).update(
+        status=AccountDeletion.Status.DONE,
+        completed_at=timezone.now(),
+    )
+
+
+def purge_pending_accounts(batch_size=DEFAULT_BATCH_SIZE):
+    deletions = AccountDeletion.objects.exclude(status=AccountDeletion.Status.DONE).select_related('user')
+    purged = 0
+    for deletion in deletions.order_by('requested_at'):
+        purge_account(deletion, batch_size)
+        purged += 1
+    return purged
@@ -0,0 +1,198 @@
+from datetime import datetime
+
+from django.db.models import Count, Exists, Max, OuterRef, Q
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Question, Vote
+from .pagination import decode_cursor, encode_cursor
+
+NEW_FEED_ORDERING = ('-pinned', '-created_at', '-id')
+NEW_FEED_PAGE_SIZE = 30
+HOT_GRAVITY = 1.8
+HOT_BASE_OFFSET = 2.0
+
+
+def question_feed(user=None):
+    # Bylines come from the in-process directory (questions/directory.py), not a join.
+    questions = Question.objects.annotate(
+        score=Count('votes', distinct=True),
+        # Archived threads keep their comments in the archive row.
+        comments_count=Count('comments', distinct=True) + Coalesce(Max('archive__comments_count'), 0),
+    )
+    if user is not None and user.is_authenticated:
+        questions = questions.annotate(
+            has_voted=Exists(Vote.objects.filter(question=OuterRef('pk'), user=user))
+        )
+    return questions
+
+
+def hot_rank(score, comments_count, created_at, now):
+    age_hours = max((now - created_at).total_seconds() / 3600.0, 0.0)
+    points = score or 0
+    comments = comments_count or 0
+    return (points + 0.8 * comments) / pow(age_hours + HOT_BASE_OFFSET, HOT_GRAVITY)
+
+
+def hot_sort_key(pinned, rank_score, score, created_at):
+    return (
+        0 if pinned else 1,
+        -(rank_score or 0.0),
+        -(score or 0),
+        -created_at.timestamp(),
+    )
+
+
+def new_feed_cursor(pinned, created_at, pk):
+    return encode_cursor([int(pinned), created_at.isoformat(), pk])
+
+
+def _after_new_feed_cursor(queryset, cursor):
+    values = decode_cursor(cursor)
+    try:
+        pinned, created_at, pk = bool(values[0]), datetime.fromisoformat(values[1]), int(values[2])
+    except (TypeError, ValueError, IndexError):
+        return queryset
+    return queryset.filter(
+        Q(pinned__lt=pinned)
+        | Q(pinned=pinned, created_at__lt=created_at)
+        | Q(pinned=pinned, created_at=created_at, pk__lt=pk)
+    )
+
+
+def new_feed_page_ids(cursor=None, page_size=NEW_FEED_PAGE_SIZE):
+    """
+    Locate one page of the "new" feed and the cursor for the next page.
+
+    The page is found with a keyset scan over the (pinned, created_at, id)
+    index, so callers only compute vote and comment counts for the rows that
+    are actually shown.
+    """
+    keys = list(
+        _after_new_feed_cursor(Question.objects.order_by(*NEW_FEED_ORDERING), cursor)
+        .values_list('pk', 'pinned', 'created_at')[:page_size + 1]
+    )
+    next_cursor = None
+    if len(keys) > page_size:
+        pk, pinned, created_at = keys[page_size - 1]
+        next_cursor = new_feed_cursor(pinned, created_at, pk)
+    return [key[0] for key in keys[:page_size]], next_cursor
+
+
+def new_feed_page(user=None, cursor=None, page_size=NEW_FEED_PAGE_SIZE):
+    page_ids, next_cursor = new_feed_page_ids(cursor, page_size)
+    questions = list(question_feed(user).filter(pk__in=page_ids).order_by(*NEW_FEED_ORDERING))
+    return questions, next_cursor
+
+
+def thread_comments(question_id):
+    return Comment.objects.filter(question_id=question_id).order_by('created_at', 'id')
+
+
+def comment_depths(parents):
+    """
+    Map comment id -> nesting depth for a page of comments, given as id -> parent_id.
+
+    Only the ancestors of those comments are read, one query per level of
+    nesting, so a page costs O(page x depth) rather than the whole thread.
+    """
+    parents = dict(parents)
+    missing = {parent_id for parent_id in parents.values() if parent_id is not None} - parents.keys()
+    while missing:
+        loaded = dict(Comment.objects.filter(pk__in=missing).values_list('id', 'parent_id'))
+        parents.update(loaded)
+        missing = {parent_id for parent_id in loaded.values() if parent_id is not None} - parents.keys()
+    return depths_from_parents(parents)
+
+
+def depths_from_parents(parents):
+    depths = {}
+    for comment_id in parents:
+        chain = []
+        current = comment_id
+        while current is not None and current not in depths and current in parents:
+            chain.append(current)
+            current = parents[current]
+        depth = depths.get(current, -1) if current is not None else -1
+        for node in reversed(chain):
+            depth += 1
+            depths[node] = depth
+    return depths
+
+
+def thread_tree_order(question_id):
+    """
+    ``[comment id, has replies, subtrees closed after it]`` in display order, from (id, parent_id) pairs only.
+
+    The order is the nested tree question_detail renders: each comment is
+    followed by its replies, and siblings go oldest first.
+    """
+    children = {}
+    pairs = Comment.objects.filter(question_id=question_id).order_by('created_at', 'id').values_list('id', 'parent_id')
+    for comment_id, parent_id in pairs.iterator(chunk_size=2000):
+        children.setdefault(parent_id, []).append(comment_id)
+    order = []
+    stack = [iter(children.get(None, ()))]
+    while stack:
+        comment_id = next(stack[-1], None)
+        if comment_id is None:
+            stack.pop()
+            if stack:
+                # The replies of the comment that opened this level are done.
+                order[-1][2] += 1
+            continue
+        replies = children.get(comment_id)
+        order.append([comment_id, bool(replies), 0])
+        if replies:
+            stack.append(iter(replies))
+    return order
+
+
+def latest_thread_change(question_id):
+    """The most recently created or edited comment, straight from the (question, updated_at, id) index."""
+    return (
+        Comment.objects.filter(question_id=question_id)
+        .order_by('-updated_at', '-id')
+        .only('id', 'updated_at')
+        .first()
+    )
+
+
+THREAD_UPDATES_PAGE_SIZE = 100
+
+
+def thread_updates_cursor(updated_at, pk):
+    return encode_cursor([updated_at.isoformat(), pk])
+
+
+def latest_thread_cursor(question, comments):
+    """Cursor just past the newest change among already-loaded comments (or the question itself)."""
+    if not comments:
+        return thread_updates_cursor(question.created_at, 0)
+    latest = max(comments, key=lambda comment: (comment.updated_at, comment.pk))
+    return thread_updates_cursor(latest.updated_at, latest.pk)
+
+
+def thread_updates(question_id, cursor, page_size=THREAD_UPDATES_PAGE_SIZE):
+    """
+    Comments created or edited after ``cursor``, oldest change first.
+
+    Walks the (question, updated_at, id) index from the cursor, so a poll
+    costs in proportion to the new activity rather than the thread size.
+    Returns ``(comments, next_cursor, has_more)``; an unreadable cursor
+    yields no comments so clients never refetch a whole thread by mistake.
+    """
+    values = decode_cursor(cursor)
+    try:
+        updated_at, last_id = datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError, IndexError):
+        return [], None, False
+    comments = list(
+        Comment.objects.filter(question_id=question_id)
+        .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=last_id))
+        .order_by('updated_at', 'id')[:page_size + 1]
+    )
+    has_more = len(comments) > page_size
+    comments = comments[:page_size]
+    if not comments:
+        return [], cursor, False
+    return comments, thread_updates_cursor(comments[-1].updated_at, comments[-1].pk), has_more
@@ -0,0 +1,101 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse '10/m' into (10, 60)."""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period.strip().lower()[:1]]
+
+
+def client_ip(request):
+    """
+    The client address as seen by our own proxies.
+
+    Clients can send any X-Forwarded-For they like, so only the entries
+    appended by the TRUSTED_PROXY_COUNT proxies in front of the app count:
+    the client is the right-most entry that is not one of theirs.
+    CF-Connecting-IP is used only with TRUST_CF_CONNECTING_IP, i.e. when
+    the origin is reachable through Cloudflare alone.
+    """
+    if settings.TRUST_CF_CONNECTING_IP:
+        connecting_ip = request.META.get('HTTP_CF_CONNECTING_IP', '').strip()
+        if connecting_ip:
+            return connecting_ip
+    if settings.TRUSTED_PROXY_COUNT:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= settings.TRUSTED_PROXY_COUNT:
+            return hops[-settings.TRUSTED_PROXY_COUNT]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _identity(request):
+    # Read the user id straight from the session so no User query is needed.
+    user_id = request.session.get(SESSION_KEY) if hasattr(request, 'session') else None
+    return f'user:{user_id}' if user_id else f'ip:{client_ip(request)}'
+
+
+def check_rate_limit(request, scope):
+    """
+    Count one hit against the scope's limit; return seconds to wait when it is exceeded, else None.
+
+    This approximates a token bucket of `limit` tokens refilled over `period`
+    with a sliding window: the previous window's count is weighted by how much
+    of it still overlaps. Only cache.add/incr/get are used, which are atomic
+    on shared backends, so the limit holds across processes and replicas.
+    """
+    rate = settings.RATE_LIMITS.get(scope)
+    if not rate:
+        return None
+    limit, period = parse_rate(rate)
+    now = time.time()
+    window = int(now // period)
+    elapsed = (now % period) / period
+    base_key = f'ratelimit:{scope}:{_identity(request)}'
+    current_key = f'{base_key}:{window}'
+    cache.add(current_key, 0, period * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        cache.set(current_key, 1, period * 2)
+        current = 1
+    previous = cache.get(f'{base_key}:{window - 1}', 0)
+    if previous * (1 - elapsed) + current <= limit:
+        return None
+    metrics.increment('rate_limit_hits_total', scope=scope)
+    return max(math.ceil(period * (1 - elapsed)), 1)
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Reject requests over settings.RATE_LIMITS[scope] with 429 before the view runs."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            checked = getattr(request, '_rate_limit_scopes', set())
+            if request.method in methods and scope not in checked:
+                request._rate_limit_scopes = checked | {scope}
+                retry_after = check_rate_limit(request, scope)
+                if retry_after is not None:
+                    response = HttpResponse(
+                        'Too many requests. Please slow down.',
+                        status=429,
+                        content_type='text/plain',
+                    )
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response
+            return view_func(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,234 @@
+import contextvars
+import hashlib
+import logging
+import math
+import re
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Max
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = str(Path(__file__).resolve().parent)
+THIS_FILE = str(Path(__file__).resolve())
+# The tuned SQLite backend wraps every write; its frames say nothing about where a query came from.
+BACKEND_DIR = str(Path(APP_DIR) / 'sqlite')
+
+_current_request = contextvars.ContextVar('slow_query_request', default=None)
+_recording = contextvars.ContextVar('slow_query_recording', default=False)
+
+# Slow queries are queued here and written by one background thread on its own connections.
+PENDING_LIMIT = 1000
+_pending = deque(maxlen=PENDING_LIMIT)
+_wake_writer = threading.Event()
+_writer_lock = threading.Lock()
+_writer = None
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Replace literals and placeholders with ?, so queries that differ only in values compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?...)', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode('utf-8')).hexdigest()[:16]
+
+
+def call_site():
+    """The innermost frame in this app (outside this module) that led to the query, as "path:line in func"."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(APP_DIR)
+            and filename != THIS_FILE
+            and not filename.startswith(BACKEND_DIR)
+            and '/migrations/' not in filename
+        ):
+            relative = Path(filename).relative_to(Path(APP_DIR).parent)
+            return f'{relative}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def _param_count(params, many):
+    if params is None:
+        return 0
+    if many:
+        params = list(params)
+        return len(params[0]) if params else 0
+    return len(params)
+
+
+def slow_query_logger(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None or _recording.get():
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= threshold:
+        _record(context['connection'], sql, params, many, duration_ms)
+    return result
+
+
+def _record(connection, sql, params, many, duration_ms):
+    normalized = normalize_sql(sql)
+    if len(_pending) == _pending.maxlen:
+        metrics.increment('slow_queries_dropped_total')
+    _pending.append({
+        'using': connection.alias,
+        'fingerprint': fingerprint(normalized),
+        'sql': normalized,
+        'params_count': _param_count(params, many),
+        'duration_ms': duration_ms,
+        'view_name': _view_name(_current_request.get()),
+        'call_site': call_site(),
+    })
+    _start_writer()
+    _wake_writer.set()
+
+
+def flush():
+    """
+    Write the buffered slow queries on the calling thread's connections and trim the log.
+
+    Runs on the writer thread; never call it from inside an execute wrapper,
+    which would write through the connection whose statement is being wrapped.
+    """
+    from .models import SlowQuery
+
+    entries = []
+    while _pending:
+        entries.append(_pending.popleft())
+    by_alias = {}
+    for entry in entries:
+        by_alias.setdefault(entry.pop('using'), []).append(SlowQuery(**entry))
+    token = _recording.set(True)
+    try:
+        for alias, rows in by_alias.items():
+            try:
+                with transaction.atomic(using=alias):
+                    SlowQuery.objects.using(alias).bulk_create(rows)
+                    newest = SlowQuery.objects.using(alias).aggregate(newest=Max('pk'))['newest']
+                    SlowQuery.objects.using(alias).filter(pk__lte=newest - settings.SLOW_QUERY_LOG_SIZE).delete()
+            except DatabaseError:
+                logger.warning('Could not record %d slow queries', len(rows), exc_info=True)
+    finally:
+        _recording.reset(token)
+    return len(entries)
+
+
+def _write_forever():
+    _recording.set(True)
+    while True:
+        _wake_writer.wait()
+        _wake_writer.clear()
+        try:
+            flush()
+        finally:
+            connections.close_all()
+
+
+def _start_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_forever, name='slow-query-writer', daemon=True)
+            _writer.start()
+
+
+def install(connection, **kwargs):
+    """connection_created receiver: wrap every statement on the new connection."""
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_logger)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None) if request is not None else None
+    if match is None:
+        return ''
+    view_func = match.func
+    return f'{view_func.__module__}.{getattr(view_func, "__qualname__", view_func.__class__.__name__)}'
+
+
+class SlowQueryViewMiddleware:
+    """
+    Remembers which request is running so slow queries can be attributed to its view.
+
+    The view is looked up only when a slow query is recorded, so the
+    middleware is just a context variable on either side of ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+
+def summarize(queryset):
+    """Aggregate logged statements by fingerprint: count, total and p95 duration, plus where they came from."""
+    groups = {}
+    rows = queryset.order_by().values_list('fingerprint', 'sql', 'duration_ms', 'view_name', 'call_site')
+    for fingerprint_, sql, duration_ms, view_name, site in rows.iterator():
+        group = groups.setdefault(
+            fingerprint_,
+            {'fingerprint': fingerprint_, 'sql': sql, 'durations': [], 'views': set(), 'call_sites': set()},
+        )
+        group['durations'].append(duration_ms)
+        if view_name:
+            group['views'].add(view_name)
+        if site:
+            group['call_sites'].add(site)
+    summary = []
+    for group in groups.values():
+        durations = sorted(group.pop('durations'))
+        group.update(
+            count=len(durations),
+            total_ms=sum(durations),
+            p95_ms=durations[max(math.ceil(len(durations) * 0.95) - 1, 0)],
+            views=sorted(group['views']),
+            call_sites=sorted(group['call_sites']),
+        )
+        summary.append(group)
+    return sorted(summary, key=lambda group: group['total_ms'], reverse=True)
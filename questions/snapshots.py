@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from itertools import batched
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
+from django.urls import reverse
+
+from .models import ArchivedThread, Question
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+SNAPSHOT_BATCH_SIZE = 500
+# Everything the page shows outside the archive blob, besides the commenters' bylines; a change here means a rebuild.
+SNAPSHOT_FIELDS = (
+    'id',
+    'slug',
+    'title',
+    'body_html',
+    'link',
+    'created_at',
+    'author__username',
+    'author__profile__is_vip',
+    'archive__score',
+    'archive__archived_at',
+)
+
+
+class SnapshotRequest(HttpRequest):
+    """An anonymous GET for a canonical page, addressed as SITE_URL so absolute links come out right."""
+
+    def __init__(self, path):
+        super().__init__()
+        site = urlsplit(settings.SITE_URL)
+        self.site_scheme = site.scheme or 'https'
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.META = {
+            'HTTP_HOST': site.netloc or 'localhost',
+            'SERVER_NAME': site.hostname or 'localhost',
+            'SERVER_PORT': '443' if self.site_scheme == 'https' else '80',
+            'QUERY_STRING': '',
+        }
+        self.user = AnonymousUser()
+
+    def _get_scheme(self):
+        return self.site_scheme
+
+
+def snapshot_root():
+    return Path(settings.SNAPSHOT_ROOT) if settings.SNAPSHOT_ROOT else None
+
+
+def snapshot_dir(root, slug):
+    """Directory nginx maps ``/questions/<slug>/`` onto (``index.html`` and ``index.html.gz``)."""
+    return root / 'questions' / slug
+
+
+def _with_commenter_bylines(rows):
+    """Add each thread's commenters' (username, is_vip) to its rows, since the page renders them from the directory."""
+    Participant = ArchivedThread.participants.through
+    for batch in batched(rows, SNAPSHOT_BATCH_SIZE):
+        bylines = {}
+        participants = (
+            Participant.objects.filter(archivedthread_id__in=[row['id'] for row in batch])
+            .order_by('archivedthread_id', 'user_id')
+            .values_list('archivedthread_id', 'user__username', 'user__profile__is_vip')
+        )
+        for question_id, username, is_vip in participants:
+            bylines.setdefault(question_id, []).append([username, bool(is_vip)])
+        for row in batch:
+            row['commenters'] = bylines.get(row['id'], [])
+            yield row
+
+
+def snapshot_stamp(row):
+    return hashlib.sha1(json.dumps(row, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def render_snapshot(question_id, slug):
+    """The anonymous HTML for an archived thread's canonical page, or None if it does not render cleanly."""
+    from .views import question_detail
+
+    request = SnapshotRequest(reverse('question_detail_slug', args=[slug]))
+    response = question_detail(request, question_id)
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def _replace_file(path, data):
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as handle:
+        handle.write(data)
+    os.chmod(handle.name, 0o644)
+    os.replace(handle.name, path)
+
+
+def write_snapshot(root, slug, html):
+    directory = snapshot_dir(root, slug)
+    directory.mkdir(parents=True, exist_ok=True)
+    # gzip first: nginx's gzip_static only looks for it once index.html exists.
+    _replace_file(directory / 'index.html.gz', gzip.compress(html, compresslevel=9, mtime=0))
+    _replace_file(directory / 'index.html', html)
+
+
+def remove_snapshot(root, slug):
+    shutil.rmtree(snapshot_dir(root, slug), ignore_errors=True)
+
+
+def discard_snapshot(question_id):
+    """Drop a thread's snapshot right away; build_snapshots renders it again if it is still archived."""
+    root = snapshot_root()
+    if root is None:
+        return
+    slug = Question.objects.filter(pk=question_id).values_list('slug', flat=True).first()
+    if slug:
+        remove_snapshot(root, slug)
+
+
+def _load_manifest(root):
+    try:
+        return json.loads((root / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def build_snapshots(root=None, full=False):
+    """
+    Bring the snapshot directory in line with the archived threads.
+
+    Only threads whose stamp changed (or whose file went missing) are
+    rendered again, and snapshots of threads that were unarchived or
+    deleted are removed. Returns ``(written, removed, unchanged)``.
+    """
+    root = Path(root) if root else snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    previous = _load_manifest(root)
+    manifest = {}
+    written = unchanged = 0
+    rows = Question.objects.filter(archive__isnull=False).order_by('pk').values(*SNAPSHOT_FIELDS)
+    for row in _with_commenter_bylines(rows.iterator(chunk_size=SNAPSHOT_BATCH_SIZE)):
+        key = str(row['id'])
+        stamp = snapshot_stamp(row)
+        entry = {'slug': row['slug'], 'stamp': stamp}
+        old = previous.pop(key, None)
+        if not full and old == entry and (snapshot_dir(root, row['slug']) / 'index.html').exists():
+            manifest[key] = entry
+            unchanged += 1
+            continue
+        if old and old['slug'] != row['slug']:
+            remove_snapshot(root, old['slug'])
+        html = render_snapshot(row['id'], row['slug'])
+        if html is None:
+            logger.warning("Snapshot of question %s did not render; leaving it to the app", row['id'])
+            remove_snapshot(root, row['slug'])
+            continue
+        write_snapshot(root, row['slug'], html)
+        manifest[key] = entry
+        written += 1
+    for entry in previous.values():
+        remove_snapshot(root, entry['slug'])
+    _replace_file(root / MANIFEST_NAME, json.dumps(manifest).encode('utf-8'))
+    return written, len(previous), unchanged
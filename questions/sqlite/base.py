@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+from questions import metrics
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class WriterLock:
+    """
+    A lock the thread holding it can take again.
+
+    An autocommit write holds the lock for its statement, and anything that
+    runs inside that statement's execute wrappers on the same thread may
+    start a transaction, which needs the lock too. Each acquire must be
+    matched by a release from the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self):
+        me = threading.get_ident()
+        if self._owner == me:
+            self._depth += 1
+            return
+        start = time.perf_counter()
+        self._lock.acquire()
+        metrics.increment('sqlite_writer_wait_seconds_total', time.perf_counter() - start)
+        self._owner = me
+        self._depth = 1
+
+    def release(self):
+        if self._owner != threading.get_ident():
+            raise RuntimeError('The SQLite writer lock is held by another thread.')
+        self._depth -= 1
+        if not self._depth:
+            self._owner = None
+            self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# One writer at a time per process: threads queue here instead of spinning on SQLite's busy handler.
+WRITER_LOCK = WriterLock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend that serializes this process's writes through WRITER_LOCK.
+
+    Transactions (BEGIN IMMEDIATE with transaction_mode) hold the lock until
+    commit or rollback; single writes in autocommit mode hold it for the
+    statement. Other processes still wait on busy_timeout, but they only ever
+    compete with one writer from each process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._holds_writer_lock = False
+        self.execute_wrappers.append(self._serialize_autocommit_writes)
+
+    def _uses_writer_lock(self):
+        return not self.is_in_memory_db()
+
+    def _serialize_autocommit_writes(self, execute, sql, params, many, context):
+        if self.in_atomic_block or self._holds_writer_lock or not self._uses_writer_lock():
+            return execute(sql, params, many, context)
+        if not sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            return execute(sql, params, many, context)
+        WRITER_LOCK.acquire()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            WRITER_LOCK.release()
+
+    def _start_transaction_under_autocommit(self):
+        if self._uses_writer_lock() and not self._holds_writer_lock:
+            WRITER_LOCK.acquire()
+            self._holds_writer_lock = True
+        try:
+            super()._start_transaction_under_autocommit()
+        except Exception:
+            self._release_writer_lock()
+            raise
+
+    def _release_writer_lock(self):
+        if self._holds_writer_lock:
+            self._holds_writer_lock = False
+            WRITER_LOCK.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_writer_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_writer_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._release_writer_lock()
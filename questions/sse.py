@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import events
+from .models import Question
+
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Tell the nginx sidecar not to buffer the stream.
+    (b'x-accel-buffering', b'no'),
+]
+
+
+async def event_stream(channel):
+    yield 'retry: 5000\n\n'
+    async for event in events.get_broker().subscribe(channel, heartbeat=settings.SSE_HEARTBEAT_SECONDS):
+        if event is None:
+            yield ': ping\n\n'
+        else:
+            yield f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+
+
+def _question_exists(pk):
+    try:
+        return Question.objects.filter(pk=pk).exists()
+    finally:
+        # The stream outlives the check by hours; don't keep a connection open for it.
+        connections.close_all()
+
+
+async def stream_channel(scope):
+    """The channel an SSE request subscribes to, or None for requests Django should answer."""
+    if scope['type'] != 'http' or scope['method'] != 'GET' or not scope['path'].endswith('/events/'):
+        return None
+    try:
+        match = resolve(scope['path'].removeprefix(scope.get('root_path', '')))
+    except Resolver404:
+        return None
+    if match.url_name == 'front_page_events':
+        return events.FRONT_PAGE_CHANNEL
+    if match.url_name == 'question_events' and await sync_to_async(_question_exists)(match.kwargs['pk']):
+        return events.question_channel(match.kwargs['pk'])
+    # Unknown questions get their 404 from the view.
+    return None
+
+
+class EventStreamDispatcher:
+    """
+    ASGI app that serves the SSE endpoints itself and hands every other request to Django.
+
+    Django runs a request's sync middleware in a thread kept for the whole
+    response, so a stream served there holds a thread per idle client. The
+    streams are public and need no session or user, so they are answered here,
+    on the event loop, and cost a queue and a suspended coroutine each.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        channel = await stream_channel(scope)
+        if channel is None:
+            return await self.application(scope, receive, send)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS})
+        relay = asyncio.ensure_future(self._relay(channel, send))
+        disconnect = asyncio.ensure_future(self._disconnect(receive))
+        done, pending = await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if relay in done:
+            relay.result()
+
+    @staticmethod
+    async def _relay(channel, send):
+        stream = event_stream(channel)
+        try:
+            async for chunk in stream:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        finally:
+            await stream.aclose()
+
+    @staticmethod
+    async def _disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
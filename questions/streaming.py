@@ -0,0 +1,65 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+
+from .directory import attach_bylines
+from .models import Comment
+from .queries import thread_tree_order
+
+# Must match the placeholder in questions/question_detail.html.
+COMMENT_STREAM_MARKER = '<!--comment-stream-->'
+STREAM_CHUNK_SIZE = 100
+
+
+def _comment_chunks(request, question_id, chunk_size):
+    head = get_template('questions/_comment_head.html')
+    context = {'request': request, 'user': request.user, 'archived': False, 'comment_next': request.get_full_path()}
+    order = thread_tree_order(question_id)
+    for start in range(0, len(order), chunk_size):
+        rows = order[start:start + chunk_size]
+        comments = {comment.pk: comment for comment in Comment.objects.filter(pk__in=[row[0] for row in rows]).iterator()}
+        attach_bylines(list(comments.values()))
+        parts = []
+        for comment_id, has_replies, closes in rows:
+            parts.append(f'<li class="hn-comment" data-comment-id="{comment_id}">')
+            comment = comments.get(comment_id)
+            # A comment deleted since the tree was read keeps its slot so its replies stay nested.
+            if comment is not None:
+                comment.children = has_replies
+                parts.append(head.render({**context, 'comment': comment}))
+            parts.append('<ul class="hn-comment-children" data-collapsible="true">' if has_replies else '</li>')
+            parts.append('</ul></li>' * closes)
+        yield ''.join(parts)
+
+
+async def _async_chunks(chunks):
+    # Django buffers a sync iterator completely under ASGI; step it in the ORM's thread instead.
+    step = sync_to_async(next)
+    done = object()
+    while (chunk := await step(chunks, done)) is not done:
+        yield chunk
+
+
+def stream_thread(request, question_id, context, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream question_detail: everything up to the comment list at once, then comments in chunks.
+
+    The page around the comments is rendered before returning, so the CSRF
+    cookie and other response headers are settled when streaming starts.
+    """
+    page = render_to_string('questions/question_detail.html', {**context, 'streamed_comments': True}, request=request)
+    before, after = page.split(COMMENT_STREAM_MARKER, 1)
+
+    def chunks():
+        yield before
+        yield from _comment_chunks(request, question_id, chunk_size)
+        yield after
+
+    content = chunks()
+    if isinstance(request, ASGIRequest):
+        content = _async_chunks(content)
+    response = StreamingHttpResponse(content, content_type='text/html; charset=utf-8')
+    # Tell the nginx sidecar to pass chunks on as they come.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,10 +1,59 @@
+import asyncio
+import gzip
+import re
+import zlib
+import pstats
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
 from django.test.utils import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from unittest.mock import patch
 
-from .models import Comment, Question
+from asgiref.sync import iscoroutinefunction
+from philonet.asgi import application
+
+from . import caching, events, metrics, slowqueries
+from .archive import archive_question, archive_stale_threads, archived_comment_rows, unarchive_question
+from .compression import CompressionMiddleware
+from .directory import bylines
+from .fallback import breaker
+from .snapshots import build_snapshots
+from .models import (
+    AccountDeletion,
+    ArchivedThread,
+    Comment,
+    DigestFrequency,
+    Profile,
+    Question,
+    RequestProfile,
+    SlowQuery,
+    Vote,
+)
+from .notifications import send_new_post_digests
+from .pagination import encode_cursor
+from .profiling import ProfilerMiddleware, wants_profile
+from .purge import delete_user_content, purge_pending_accounts
+from .queries import new_feed_page
+from .ratelimit import client_ip
+from .slowqueries import SlowQueryViewMiddleware, normalize_sql
+from .sqlite.base import WRITER_LOCK
+from .usercache import cached_user, user_cache_key
+from .validators import CommonPasswordListValidator, ComplexityPasswordValidator
 
 
 class AdminImpersonationTests(TestCase):
@@ -178,6 +227,35 @@ class NotificationDispatchTests(TestCase):
         self.assertEqual(mock_send.call_count, 1)
         self.assertEqual(mock_send.call_args[0][0], 'watcher@example.com')
 
+    @patch('questions.notifications._send_smtp2go_email')
+    def test_digest_subscribers_get_one_email_per_window(self, mock_send):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='author-pass-1234',
+        )
+        reader = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='reader-pass-1234',
+        )
+        for user in (author, reader):
+            user.profile.notify_new_posts = True
+            user.profile.new_posts_frequency = DigestFrequency.DAILY
+            user.profile.save(update_fields=['notify_new_posts', 'new_posts_frequency'])
+
+        Question.objects.create(title='First post', body='Body', author=author)
+        Question.objects.create(title='Second post', body='Body', author=author)
+        self.assertEqual(mock_send.call_count, 0)
+
+        sent = send_new_post_digests(DigestFrequency.DAILY)
+
+        self.assertEqual(mock_send.call_count, 1)
+        self.assertEqual(mock_send.call_args[0][0], 'reader@example.com')
+        self.assertIn('First post', mock_send.call_args[0][2])
+        self.assertIn('Second post', mock_send.call_args[0][2])
+        self.assertEqual(sent, 1)
+
     @patch('questions.notifications._send_smtp2go_email')
     def test_reply_notifies_comment_and_post_authors(self, mock_send):
         post_author = User.objects.create_user(
@@ -258,3 +336,1171 @@ class NotificationDispatchTests(TestCase):
 
         self.assertEqual(mock_send.call_count, 1)
         self.assertEqual(mock_send.call_args[0][0], 'owner@example.com')
+
+
+class MigrateIfNeededCommandTests(TestCase):
+    @patch('questions.management.commands.migrate_if_needed.call_command')
+    def test_skips_migrate_when_plan_is_empty(self, mock_call_command):
+        stdout = StringIO()
+        call_command('migrate_if_needed', stdout=stdout)
+
+        mock_call_command.assert_not_called()
+        self.assertIn('No migrations to apply', stdout.getvalue())
+
+
+class HealthAndWarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='author-pass-1234',
+        )
+        Question.objects.create(title='Cached question', body='Body', author=self.author)
+
+    def test_healthz_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.status_code, 200)
+
+    @patch.dict('questions.warmup._state', {'ready': False, 'duration': None, 'error': None})
+    def test_readyz_warms_front_page_cache(self):
+        response = self.client.get(reverse('readyz'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ready')
+        self.assertIsNotNone(response.json()['warmup_seconds'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('question_list'))
+        self.assertContains(response, 'Cached question')
+
+    def test_new_question_invalidates_front_page_cache(self):
+        self.client.get(reverse('question_list'))
+        Question.objects.create(title='Fresh question', body='Body', author=self.author)
+
+        response = self.client.get(reverse('question_list'))
+        self.assertContains(response, 'Fresh question')
+
+    def test_unknown_sorts_share_the_hot_page_cache_entry(self):
+        self.client.get(reverse('question_list'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('question_list'), {'sort': 'random-1234'})
+        self.assertContains(response, 'Cached question')
+
+
+class NewFeedPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='author-pass-1234',
+        )
+        self.questions = [
+            Question.objects.create(title=f'Question {index}', body='Body', author=self.author)
+            for index in range(5)
+        ]
+        self.questions[1].pinned = True
+        self.questions[1].save(update_fields=['pinned'])
+
+    def test_cursor_walks_feed_without_gaps_or_duplicates(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = new_feed_page(cursor=cursor, page_size=2)
+            seen.extend(question.title for question in page)
+            if not cursor:
+                break
+
+        self.assertEqual(seen, ['Question 1', 'Question 4', 'Question 3', 'Question 2', 'Question 0'])
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        page, _ = new_feed_page(cursor='not-a-cursor', page_size=2)
+        self.assertEqual([question.title for question in page], ['Question 1', 'Question 4'])
+
+    def test_new_feed_view_follows_cursor(self):
+        _, cursor = new_feed_page(page_size=3)
+        response = self.client.get(reverse('question_list'), {'sort': 'new', 'cursor': cursor})
+
+        self.assertContains(response, 'Question 2')
+        self.assertContains(response, 'Question 0')
+        self.assertNotContains(response, 'Question 4')
+
+
+class JsonApiTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='author-pass-1234',
+        )
+        self.question = Question.objects.create(title='API question', body='Body', author=self.author)
+        root = Comment.objects.create(question=self.question, author=self.author, body='Root')
+        Comment.objects.create(question=self.question, author=self.author, body='Reply', parent=root)
+
+    def test_question_list_supports_sparse_fields(self):
+        response = self.client.get(reverse('api_question_list'), {'sort': 'new', 'fields': 'id,title,score'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {'results': [{'id': self.question.pk, 'title': 'API question', 'score': 0}], 'next': None},
+        )
+
+    def test_comment_thread_is_flat_with_depth(self):
+        response = self.client.get(
+            reverse('api_question_comments', args=[self.question.pk]),
+            {'fields': 'body,parent_id,depth'},
+        )
+
+        results = response.json()['results']
+        self.assertEqual([item['body'] for item in results], ['Root', 'Reply'])
+        self.assertEqual([item['depth'] for item in results], [0, 1])
+        self.assertIsNone(results[0]['parent_id'])
+
+    def test_comment_depth_walks_ancestors_outside_the_page(self):
+        reply = Comment.objects.get(body='Reply')
+        Comment.objects.create(question=self.question, author=self.author, body='Deep', parent=reply)
+        cursor = encode_cursor([reply.created_at.isoformat(), reply.pk])
+
+        response = self.client.get(
+            reverse('api_question_comments', args=[self.question.pk]),
+            {'fields': 'body,depth', 'cursor': cursor},
+        )
+
+        self.assertEqual(response.json()['results'], [{'body': 'Deep', 'depth': 2}])
+
+    def test_etag_returns_not_modified(self):
+        url = reverse('api_question_detail', args=[self.question.pk])
+        etag = self.client.get(url).headers['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        self.leaver = User.objects.create_user(
+            username='leaver',
+            email='leaver@example.com',
+            password='leaver-pass-1234',
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='other-pass-1234',
+        )
+        self.own_question = Question.objects.create(title='Leaver post', body='Body', author=self.leaver)
+        self.other_question = Question.objects.create(title='Other post', body='Body', author=self.other)
+        Comment.objects.create(question=self.own_question, author=self.other, body='On leaver post')
+        self.leaver_comment = Comment.objects.create(
+            question=self.other_question, author=self.leaver, body='Leaver comment'
+        )
+        self.reply = Comment.objects.create(
+            question=self.other_question, author=self.other, body='Reply', parent=self.leaver_comment
+        )
+        Vote.objects.create(question=self.other_question, user=self.leaver)
+        Vote.objects.create(question=self.own_question, user=self.other)
+
+    def test_delete_deactivates_and_queues_purge(self):
+        self.client.force_login(self.leaver)
+        response = self.client.post(
+            reverse('account_delete'),
+            {'password': 'leaver-pass-1234', 'confirm': 'on'},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.leaver.refresh_from_db()
+        self.assertFalse(self.leaver.is_active)
+        self.assertTrue(Question.objects.filter(author=self.leaver).exists())
+        self.assertEqual(AccountDeletion.objects.get().status, AccountDeletion.Status.PENDING)
+
+    def test_purge_removes_content_in_batches(self):
+        deletion = AccountDeletion.objects.create(user=self.leaver, username=self.leaver.username)
+
+        purge_pending_accounts(batch_size=1)
+
+        self.assertFalse(User.objects.filter(username='leaver').exists())
+        self.assertEqual(list(Question.objects.values_list('title', flat=True)), ['Other post'])
+        self.assertEqual(list(Comment.objects.values_list('body', flat=True)), ['Reply'])
+        self.assertFalse(Vote.objects.exists())
+        self.reply.refresh_from_db()
+        self.assertIsNone(self.reply.parent_id)
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.DONE)
+        self.assertEqual((deletion.questions_deleted, deletion.comments_deleted, deletion.votes_deleted), (1, 2, 2))
+
+
+class PasswordHashingTests(TestCase):
+    @override_settings(PBKDF2_ITERATIONS=1000)
+    def test_login_upgrades_hash_to_configured_iterations(self):
+        user = User.objects.create_user(username='hasher', password='hasher-pass-1234')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PBKDF2_ITERATIONS=2000):
+            self.assertTrue(self.client.login(username='hasher', password='hasher-pass-1234'))
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_calibrate_hasher_suggests_iterations(self):
+        stdout = StringIO()
+        call_command('calibrate_hasher', '--probe-iterations', '1000', '--samples', '1', stdout=stdout)
+        self.assertIn('PASSWORD_HASHER_ITERATIONS=', stdout.getvalue())
+
+
+class PasswordValidatorTests(TestCase):
+    def test_built_list_rejects_listed_passwords(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            source = Path(workdir) / 'breached.txt'
+            source.write_text('Correct-Horse-9\nhunter2\nzebra-Zebra-1\n')
+            output = Path(workdir) / 'passwords.bin'
+            call_command('build_password_list', str(source), '--output', str(output), '--chunk-size', '2', stdout=StringIO())
+
+            self.assertEqual(output.stat().st_size, 3 * 8)
+            validator = CommonPasswordListValidator(output)
+            with self.assertRaises(ValidationError):
+                validator.validate('correct-horse-9')
+            validator.validate('Uncommon-Phrase-42')
+
+    def test_missing_list_falls_back_to_bundled_passwords(self):
+        validator = CommonPasswordListValidator('/nonexistent/passwords.bin')
+        with self.assertLogs('questions.validators', level='WARNING'):
+            self.assertIn('password', validator)
+        self.assertNotIn('Uncommon-Phrase-42', validator)
+
+    def test_complexity_reports_first_missing_class(self):
+        validator = ComplexityPasswordValidator()
+        with self.assertRaises(ValidationError) as raised:
+            validator.validate('lowercase-only-1')
+        self.assertEqual(raised.exception.code, 'password_no_uppercase')
+        validator.validate('Mixed-Case-1')
+
+
+@override_settings(RATE_LIMITS={'vote': '2/m', 'signup': '1/h'})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.voter = User.objects.create_user(username='voter', password='voter-pass-1234')
+        self.question = Question.objects.create(title='Limited', body='Body', author=self.voter)
+
+    def test_votes_over_limit_get_429_with_retry_after(self):
+        self.client.force_login(self.voter)
+        url = reverse('question_upvote', args=[self.question.pk])
+        self.client.post(url)
+        self.client.post(url)
+
+        with self.assertNumQueries(1):  # session lookup only
+            response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertIn('rate_limit_hits_total{scope="vote"}', metrics.render_prometheus())
+
+    def test_signup_is_limited_per_ip(self):
+        form = {'username': 'newcomer', 'password1': 'x', 'password2': 'y'}
+        self.assertEqual(self.client.post(reverse('signup'), form).status_code, 200)
+        self.assertEqual(self.client.post(reverse('signup'), form).status_code, 429)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1, TRUST_CF_CONNECTING_IP=False)
+    def test_spoofed_forwarded_for_does_not_reset_the_limit(self):
+        form = {'username': 'newcomer', 'password1': 'x', 'password2': 'y'}
+        for spoofed in ('10.0.0.1', '10.0.0.2'):
+            response = self.client.post(
+                reverse('signup'),
+                form,
+                HTTP_X_FORWARDED_FOR=f'{spoofed}, 203.0.113.7',
+                HTTP_CF_CONNECTING_IP=spoofed,
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            client_ip(RequestFactory().get('/', HTTP_X_FORWARDED_FOR='10.0.0.1, 203.0.113.7')),
+            '203.0.113.7',
+        )
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='boss-pass-1234')
+        self.question = Question.objects.create(title='Moderated thread', body='Body', author=self.admin)
+        self.client.force_login(self.admin)
+
+    def _add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(question=self.question, author=self.admin, body=f'Comment {index}') for index in range(count)
+        )
+
+    def _changelist_queries(self, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        cache.clear()  # measure every changelist with a cold session-user cache
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('admin:questions_comment_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_changelist_queries_do_not_grow_with_table_size(self):
+        self._add_comments(5)
+        small = self._changelist_queries()
+        self._add_comments(300)
+        large = self._changelist_queries()
+
+        self.assertEqual(len(small), len(large))
+        for sql in large:
+            self.assertFalse('COUNT(' in sql and 'LIMIT' not in sql, sql)
+
+    def test_search_matches_id_and_username_prefix(self):
+        self._add_comments(3)
+        other = User.objects.create_user(username='someone', password='someone-pass-1234')
+        reply = Comment.objects.create(question=self.question, author=other, body='Needle')
+        url = reverse('admin:questions_comment_changelist')
+
+        self.assertContains(self.client.get(url, {'q': str(reply.pk)}), f'/{reply.pk}/change/')
+        by_author = self.client.get(url, {'q': 'some'})
+        self.assertEqual(list(by_author.context['cl'].result_list), [reply])
+
+    def test_filtered_count_beyond_cap_is_shown_as_more_than(self):
+        self._add_comments(3)
+        url = reverse('admin:questions_comment_changelist')
+        with patch('questions.admin.COUNT_CAP', 2):
+            self.assertContains(self.client.get(url, {'created': 'day'}), 'More than 2 comments')
+        with patch('questions.admin.COUNT_CAP', 3):
+            response = self.client.get(url, {'created': 'day'})
+        self.assertContains(response, '3 comments')
+        self.assertNotContains(response, 'More than')
+
+
+class AdminBulkActionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='moderator', password='moderator-pass-1234')
+        self.spammer = User.objects.create_user(username='spammer', password='spammer-pass-1234')
+        self.source = Question.objects.create(title='Source', body='Body', author=self.admin)
+        self.target = Question.objects.create(title='Target', body='Body', author=self.admin)
+        self.client.force_login(self.admin)
+
+    def _run_action(self, model_name, action, objects, **extra):
+        return self.client.post(
+            reverse(f'admin:questions_{model_name}_changelist'),
+            {'action': action, '_selected_action': [obj.pk for obj in objects], **extra},
+        )
+
+    def test_move_comments_carries_replies_and_detaches_orphans(self):
+        moved = Comment.objects.create(question=self.source, author=self.admin, body='Moved')
+        reply = Comment.objects.create(question=self.source, author=self.admin, body='Reply', parent=moved)
+        staying = Comment.objects.create(question=self.source, author=self.admin, body='Staying')
+        answer = Comment.objects.create(question=self.source, author=self.admin, body='Answer', parent=staying)
+
+        form = self._run_action('comment', 'move_to_question', [moved, answer])
+        self.assertContains(form, 'Target question id')
+        response = self._run_action('comment', 'move_to_question', [moved, answer], target=self.target.pk, apply='1')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(Comment.objects.filter(question=self.target).values_list('body', 'parent_id')),
+            {('Moved', None), ('Reply', moved.pk), ('Answer', None)},
+        )
+        self.assertEqual(list(Comment.objects.filter(question=self.source)), [staying])
+        reply.refresh_from_db()
+        self.assertEqual((reply.question_id, reply.parent_id), (self.target.pk, moved.pk))
+
+    def test_profile_actions_delete_content_and_toggle_vip(self):
+        spam = Question.objects.create(title='Spam', body='Buy now', author=self.spammer)
+        spam_comment = Comment.objects.create(question=self.source, author=self.spammer, body='Spam comment')
+        reply = Comment.objects.create(question=self.source, author=self.admin, body='Reply', parent=spam_comment)
+        Vote.objects.create(question=spam, user=self.admin)
+
+        self._run_action('profile', 'delete_users_content', [self.spammer.profile])
+        self._run_action('profile', 'toggle_vip', [self.spammer.profile, self.admin.profile])
+
+        self.assertFalse(Question.objects.filter(author=self.spammer).exists())
+        self.assertFalse(Comment.objects.filter(author=self.spammer).exists())
+        reply.refresh_from_db()
+        self.assertIsNone(reply.parent_id)
+        self.assertTrue(User.objects.filter(pk=self.spammer.pk).exists())
+        self.spammer.profile.refresh_from_db()
+        self.admin.profile.refresh_from_db()
+        self.assertTrue(self.spammer.profile.is_vip and self.admin.profile.is_vip)
+
+    def test_toggle_vip_from_vip_filter_evicts_cached_users(self):
+        Profile.objects.filter(user=self.spammer).update(is_vip=True)
+        cached_user(self.spammer.pk)
+
+        self.client.post(
+            reverse('admin:questions_profile_changelist') + '?is_vip__exact=1',
+            {'action': 'toggle_vip', '_selected_action': [self.spammer.profile.pk]},
+        )
+
+        self.assertIsNone(cache.get(user_cache_key(self.spammer.pk)))
+        self.assertFalse(cached_user(self.spammer.pk).profile.is_vip)
+
+
+class RenderedBodyTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='writer-pass-1234')
+        self.question = Question.objects.create(title='Rendered', body='First\n<b>line</b>', author=self.author)
+
+    def test_body_html_is_rendered_on_save_and_edit(self):
+        comment = Comment.objects.create(question=self.question, author=self.author, body='a\nb')
+        self.assertEqual(self.question.body_html, 'First<br>&lt;b&gt;line&lt;/b&gt;')
+        self.assertEqual(comment.body_html, 'a<br>b')
+
+        self.client.force_login(self.author)
+        self.client.post(reverse('comment_edit', args=[comment.pk]), {'body': 'edited\n<i>'})
+
+        comment.refresh_from_db()
+        self.assertEqual(comment.body_html, 'edited<br>&lt;i&gt;')
+
+    def test_thread_emits_stored_html(self):
+        Comment.objects.bulk_create([Comment(question=self.question, author=self.author, body='bulk\nrow')])
+        response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+
+        self.assertContains(response, 'First<br>&lt;b&gt;line&lt;/b&gt;')
+        self.assertContains(response, 'bulk<br>row')
+
+
+class ThreadUpdatesTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='poller', password='poller-pass-1234')
+        self.question = Question.objects.create(title='Live thread', body='Body', author=self.author)
+        self.first = Comment.objects.create(question=self.question, author=self.author, body='First')
+        response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        self.cursor = response.context['updates_cursor']
+        self.url = reverse('question_comment_updates', args=[self.question.pk])
+
+    def test_returns_only_new_and_edited_comments_as_fragments(self):
+        reply = Comment.objects.create(question=self.question, author=self.author, body='Reply', parent=self.first)
+        self.first.body = 'First, edited'
+        self.first.save(update_fields=['body'])
+
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {'cursor': self.cursor}).json()
+
+        self.assertEqual([(item['id'], item['parent_id']) for item in data['comments']], [
+            (reply.pk, self.first.pk),
+            (self.first.pk, None),
+        ])
+        self.assertIn(f'data-comment-id="{reply.pk}"', data['comments'][0]['html'])
+        self.assertIn('First, edited', data['comments'][1]['html'])
+        self.assertEqual(self.client.get(self.url, {'cursor': data['cursor']}).json()['comments'], [])
+
+    def test_unknown_question_is_404(self):
+        response = self.client.get(reverse('question_comment_updates', args=[9999]), {'cursor': self.cursor})
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='streamer', password='streamer-pass-1234')
+        self.question = Question.objects.create(title='Streamed', body='Body', author=self.author)
+
+    def test_comment_publishes_to_thread_channel_after_commit(self):
+        with patch.object(events.get_broker(), 'publish') as mock_publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                comment = Comment.objects.create(question=self.question, author=self.author, body='Live')
+                mock_publish.assert_not_called()
+
+        mock_publish.assert_called_once_with(
+            events.question_channel(self.question.pk), {'type': 'comments', 'id': comment.pk}
+        )
+
+    async def test_stream_delivers_published_events(self):
+        response = await self.async_client.get(reverse('question_events', args=[self.question.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        next_chunk = asyncio.ensure_future(anext(stream))
+        while not events.get_broker().subscriber_count():
+            await asyncio.sleep(0)
+        await asyncio.to_thread(
+            events.get_broker().publish,
+            events.question_channel(self.question.pk),
+            {'type': 'score', 'question': self.question.pk, 'score': 3},
+        )
+
+        chunk = await asyncio.wait_for(next_chunk, 5)
+        self.assertTrue(chunk.startswith(b'event: score\ndata: '))
+        await response.streaming_content.aclose()
+
+    @staticmethod
+    def _asgi_client(path, disconnect):
+        """Scope, receive and send for an ASGI GET of ``path`` that disconnects once ``disconnect`` is set."""
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'root_path': '', 'query_string': b'', 'headers': [],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        }
+        requested = []
+        sent = []
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        return scope, receive, send, sent
+
+    def test_idle_streams_hold_no_threads(self):
+        clients = 20
+        counts = []
+
+        async def idle_clients():
+            disconnect = asyncio.Event()
+            before = threading.active_count()
+            streams = []
+            for _ in range(clients):
+                scope, receive, send, sent = self._asgi_client('/events/', disconnect)
+                streams.append(asyncio.ensure_future(application(scope, receive, send)))
+            async with asyncio.timeout(10):
+                while events.get_broker().subscriber_count() < clients:
+                    await asyncio.sleep(0.01)
+            counts.append(threading.active_count() - before)
+            disconnect.set()
+            await asyncio.gather(*streams)
+            counts.append(events.get_broker().subscriber_count())
+
+        # A thread of its own, like a uvicorn worker: no async_to_sync caller to borrow threads from.
+        runner = threading.Thread(target=asyncio.run, args=(idle_clients(),))
+        runner.start()
+        runner.join(15)
+        self.assertEqual(counts, [0, 0])
+
+    async def test_question_stream_closes_its_connection_before_streaming(self):
+        disconnect = asyncio.Event()
+        scope, receive, send, sent = self._asgi_client(f'/questions/{self.question.pk}/events/', disconnect)
+        with patch('questions.sse.connections') as mock_connections:
+            stream = asyncio.ensure_future(application(scope, receive, send))
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            mock_connections.close_all.assert_called_once()
+        disconnect.set()
+        await asyncio.wait_for(stream, 5)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(sent[1]['body'], b'retry: 5000\n\n')
+        self.assertEqual(events.get_broker().subscriber_count(), 0)
+
+    async def test_unknown_question_stream_falls_through_to_django(self):
+        scope, receive, send, sent = self._asgi_client('/questions/9999/events/', asyncio.Event())
+        await application(scope, receive, send)
+        self.assertEqual(sent[0]['status'], 404)
+
+    async def test_redis_listener_resubscribes_after_an_error(self):
+        broker = events.RedisBroker(url='redis://unused')
+        attempts = []
+
+        async def relay():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                raise ConnectionError('Connection reset by peer')
+            broker.deliver(events.FRONT_PAGE_CHANNEL, {'type': 'question', 'id': 1})
+            await asyncio.Event().wait()
+
+        stream = broker.subscribe(events.FRONT_PAGE_CHANNEL)
+        with patch.object(broker, '_relay', relay), patch('questions.events.RESUBSCRIBE_MIN_SECONDS', 0):
+            with self.assertLogs('questions.events', 'ERROR') as logs:
+                event = await asyncio.wait_for(anext(stream), 5)
+        broker._listener.cancel()
+        await stream.aclose()
+
+        self.assertEqual(event, {'type': 'question', 'id': 1})
+        self.assertEqual(len(attempts), 2)
+        self.assertIn('Connection reset by peer', logs.output[0])
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='profiler', password='profiler-pass-1234')
+        Question.objects.create(title='Profiled', body='Body', author=self.admin)
+        self.client.force_login(self.admin)
+
+    def test_superuser_profile_is_stored_and_downloadable(self):
+        response = self.client.get(reverse('question_list'), {'__profile': '1'})
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertGreater(profile.sql_count, 0)
+        self.assertIn('questions/question_list.html', [row['name'] for row in profile.report['templates']])
+        self.assertTrue(profile.report['functions'])
+
+        detail = self.client.get(reverse('admin:questions_requestprofile_change', args=[profile.pk]))
+        self.assertContains(detail, 'profile-%d.pstats' % profile.pk)
+        download = self.client.get(reverse('admin:questions_requestprofile_pstats', args=[profile.pk]))
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as handle:
+            handle.write(download.content)
+            handle.flush()
+            self.assertTrue(pstats.Stats(handle.name).stats)
+
+    @override_settings(PROFILER_RING_SIZE=2)
+    def test_only_superusers_profile_and_ring_is_bounded(self):
+        User.objects.create_user(username='regular', password='regular-pass-1234')
+        self.client.login(username='regular', password='regular-pass-1234')
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('question_list'), {'__profile': '1'}))
+
+        self.client.force_login(self.admin)
+        for _ in range(3):
+            self.client.get(reverse('question_list'), HTTP_X_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_profile_flag_is_read_from_the_parsed_query(self):
+        factory = RequestFactory()
+        self.assertTrue(wants_profile(factory.get('/', {'__profile': '1'})))
+        self.assertFalse(wants_profile(factory.get('/', {'__profile': '0'})))
+        self.assertFalse(wants_profile(factory.get('/', {'x__profile': '1'})))
+
+    async def test_async_chain_stays_async_and_can_be_profiled(self):
+        async def view(request):
+            return HttpResponse()
+
+        for middleware in (ProfilerMiddleware(view), SlowQueryViewMiddleware(view)):
+            self.assertTrue(iscoroutinefunction(middleware))
+
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('question_list'), {'__profile': '1'})
+        profile = await RequestProfile.objects.aget(pk=response['X-Profile-Id'])
+        self.assertGreater(profile.sql_count, 0)
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='dba', password='dba-pass-1234')
+        Question.objects.create(title='Indexed?', body='Body', author=self.admin)
+
+    def test_normalize_sql_collapses_values(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x''y' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (?...) AND name = ? LIMIT ?',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_queries_over_threshold_are_attributed_and_summarized(self):
+        # The writer thread would use its own connection, outside this test's transaction.
+        with patch('questions.slowqueries._start_writer') as start_writer:
+            self.client.get(reverse('question_list'), {'sort': 'new'})
+        start_writer.assert_called()
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+            self.assertFalse(SlowQuery.objects.exists(), 'slow queries must not be written inside the request')
+            self.assertGreater(slowqueries.flush(), 0)
+
+        entry = SlowQuery.objects.filter(view_name='questions.views.question_list').first()
+        self.assertIsNotNone(entry)
+        self.assertTrue(entry.call_site.startswith('questions/'), entry.call_site)
+
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+            self.client.force_login(self.admin)
+            response = self.client.get(reverse('admin:questions_slowquery_summary'))
+        fingerprints = [group['fingerprint'] for group in response.context['summary']]
+        self.assertIn(entry.fingerprint, fingerprints)
+        self.assertEqual(len(fingerprints), len(set(fingerprints)))
+
+
+class TunedSqliteTests(TestCase):
+    def test_tuned_connection_uses_wal_and_one_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({
+                'default': {
+                    'ENGINE': 'questions.sqlite',
+                    'NAME': str(Path(directory) / 'tuned.sqlite3'),
+                    'OPTIONS': {
+                        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in settings.SQLITE_PRAGMAS.items()),
+                        'transaction_mode': 'IMMEDIATE',
+                    },
+                },
+            })
+            connection = handler['default']
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('CREATE TABLE item (value INTEGER)')
+                    cursor.execute('INSERT INTO item VALUES (1)')
+                self.assertFalse(WRITER_LOCK.locked())
+
+                connection._start_transaction_under_autocommit()
+                self.assertTrue(WRITER_LOCK.locked())
+                connection.commit()
+                self.assertFalse(WRITER_LOCK.locked())
+            finally:
+                connection.close()
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_autocommit_write_can_start_a_transaction_on_its_thread(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({
+                'default': {
+                    'ENGINE': 'questions.sqlite',
+                    'NAME': str(Path(directory) / 'reentrant.sqlite3'),
+                    'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+                },
+            })
+            audited = []
+
+            def audit_in_transaction(execute, sql, params, many, context):
+                # Runs inside the autocommit INSERT, like a logger that writes what it saw.
+                result = execute(sql, params, many, context)
+                if sql.startswith('INSERT INTO item') and not audited:
+                    audited.append(sql)
+                    connection = context['connection']
+                    connection._start_transaction_under_autocommit()
+                    with connection.cursor() as cursor:
+                        cursor.execute("INSERT INTO audit VALUES ('item')")
+                    connection.commit()
+                return result
+
+            def write():
+                connection = handler['default']
+                connection.execute_wrappers.extend([slowqueries.slow_query_logger, audit_in_transaction])
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('CREATE TABLE item (value INTEGER)')
+                        cursor.execute('CREATE TABLE audit (name TEXT)')
+                        cursor.execute('INSERT INTO item VALUES (1)')
+                finally:
+                    connection.close()
+
+            with patch('questions.slowqueries._start_writer'):
+                writer = threading.Thread(target=write, daemon=True)
+                writer.start()
+                writer.join(5)
+            slowqueries._pending.clear()
+
+            self.assertFalse(writer.is_alive(), 'writer deadlocked on WRITER_LOCK')
+            self.assertEqual(audited, ['INSERT INTO item VALUES (1)'])
+            self.assertFalse(WRITER_LOCK.locked())
+
+    def test_benchmark_reports_both_modes(self):
+        out = StringIO()
+        call_command('bench_sqlite', threads=4, votes=20, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('defaults:', output)
+        self.assertIn("tuned: 80 votes", output)
+        self.assertIn("0 'database is locked' errors", output.split('tuned:')[1])
+
+
+class ForumExportImportTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='archivist', email='a@example.com', password='archivist-pass-1234')
+        self.author.profile.is_vip = True
+        self.author.profile.save()
+        self.question = Question.objects.create(title='Kept', body='Body\nline', author=self.author)
+        self.root = Comment.objects.create(question=self.question, author=self.author, body='Root')
+        self.reply = Comment.objects.create(question=self.question, author=self.author, body='Reply', parent=self.root)
+        Vote.objects.create(question=self.question, user=self.author)
+        Question.objects.filter(pk=self.question.pk).update(created_at=self.question.created_at.replace(year=2020))
+
+    @patch('questions.notifications._send_smtp2go_email')
+    def test_round_trip_keeps_keys_timestamps_and_threads(self, mock_send):
+        with tempfile.TemporaryDirectory() as directory:
+            dump = Path(directory) / 'forum.jsonl.gz'
+            call_command('export_forum', str(dump), chunk_size=2, stderr=StringIO())
+            User.objects.all().delete()
+
+            out = StringIO()
+            call_command('import_forum', str(dump), chunk_size=2, stdout=out)
+
+        self.assertIn('2 questions.comment', out.getvalue())
+        question = Question.objects.get(pk=self.question.pk)
+        self.assertEqual(question.created_at.year, 2020)
+        self.assertEqual(question.body_html, 'Body<br>line')
+        self.assertEqual(Comment.objects.get(pk=self.reply.pk).parent_id, self.root.pk)
+        self.assertTrue(User.objects.get(username='archivist').profile.is_vip)
+        self.assertTrue(User.objects.get(username='archivist').check_password('archivist-pass-1234'))
+        self.assertEqual(Vote.objects.count(), 1)
+        mock_send.assert_not_called()
+
+    def test_import_refuses_populated_database(self):
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as dump:
+            with self.assertRaises(CommandError):
+                call_command('import_forum', dump.name)
+
+
+class ThreadArchiveTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='elder', password='elder-pass-1234')
+        self.other = User.objects.create_user(username='younger', password='younger-pass-1234')
+        self.question = Question.objects.create(title='Old thread', author=self.author)
+        self.root = Comment.objects.create(question=self.question, author=self.author, body='First <b>word</b>')
+        self.reply = Comment.objects.create(question=self.question, author=self.other, body='Reply', parent=self.root)
+        Vote.objects.create(question=self.question, user=self.other)
+        self.old = timezone.now() - timedelta(days=800)
+        Question.objects.update(created_at=self.old)
+        Comment.objects.update(created_at=self.old, updated_at=self.old)
+        Vote.objects.update(created_at=self.old)
+
+    def test_archived_thread_renders_from_archive_and_is_read_only(self):
+        fresh = Question.objects.create(title='Fresh thread', author=self.author)
+        self.assertEqual(archive_stale_threads(months=12), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(hasattr(Question.objects.get(pk=fresh.pk), 'archive'))
+        archive = ArchivedThread.objects.get(question=self.question)
+        self.assertEqual((archive.comments_count, archive.score), (2, 1))
+
+        response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        self.assertContains(response, 'First &lt;b&gt;word&lt;/b&gt;')
+        self.assertContains(response, 'This thread is archived')
+        self.assertContains(response, '1 point')
+        self.assertEqual(response.context['comments'][0].children[0].pk, self.reply.pk)
+
+        self.client.force_login(self.other)
+        self.client.post(reverse('question_detail', args=[self.question.pk]), {'body': 'Too late'})
+        self.client.post(reverse('question_upvote', args=[self.question.pk]))
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_unarchive_and_purge_restore_original_comments(self):
+        archive_stale_threads(months=12)
+        self.assertEqual(unarchive_question(self.question), 2)
+        self.assertEqual(Comment.objects.get(pk=self.reply.pk).parent_id, self.root.pk)
+        self.assertEqual(Comment.objects.get(pk=self.root.pk).created_at, self.old)
+
+        archive_stale_threads(months=12)
+        totals = delete_user_content([self.other.pk])
+        self.assertEqual((totals['comments_deleted'], totals['votes_deleted']), (1, 1))
+        archive = ArchivedThread.objects.get(question=self.question)
+        self.assertEqual([row['id'] for row in archived_comment_rows(archive)], [self.root.pk])
+        self.assertEqual((archive.comments_count, archive.score), (1, 0))
+        self.assertFalse(archive.participants.filter(pk=self.other.pk).exists())
+
+    def test_thread_active_since_it_was_picked_is_not_archived(self):
+        cutoff = timezone.now() - timedelta(days=360)
+        Comment.objects.create(question=self.question, author=self.other, body='Just in time')
+
+        self.assertIsNone(archive_question(self.question, cutoff))
+        self.assertFalse(ArchivedThread.objects.exists())
+        self.assertEqual(Comment.objects.filter(question=self.question).count(), 3)
+
+    def test_unarchive_leaves_timestamps_of_other_threads_alone(self):
+        archive_stale_threads(months=12)
+        live = Question.objects.create(title='Live thread', author=self.author)
+        inserts = []
+
+        def comment_elsewhere(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "questions_comment"'):
+                inserts.append(sql)
+                if len(inserts) == 1:
+                    Comment.objects.create(question=live, author=self.other, body='Meanwhile')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(comment_elsewhere):
+            self.assertEqual(unarchive_question(self.question), 2)
+        self.assertGreater(Comment.objects.get(question=live).created_at, self.old)
+        restored = Comment.objects.get(pk=self.reply.pk)
+        self.assertEqual((restored.created_at, restored.updated_at), (self.old, self.old))
+
+    def test_deleting_a_user_removes_their_archived_comments(self):
+        archive_stale_threads(months=12)
+        self.other.delete()
+
+        archive = ArchivedThread.objects.get(question=self.question)
+        self.assertEqual([row['id'] for row in archived_comment_rows(archive)], [self.root.pk])
+        response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        self.assertNotContains(response, '[deleted]')
+        self.assertEqual(unarchive_question(self.question), 1)
+
+    def test_naive_cursor_on_archived_thread_is_ignored(self):
+        archive_stale_threads(months=12)
+        response = self.client.get(
+            reverse('api_question_comments', args=[self.question.pk]),
+            {'cursor': encode_cursor(['2020-01-01T00:00:00', 1])},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+@override_settings(SITE_URL='https://forum.example.com', ALLOWED_HOSTS=['forum.example.com'])
+class ThreadSnapshotTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='sage', password='sage-pass-1234')
+        self.question = Question.objects.create(title='Settled question', author=author)
+        Comment.objects.create(question=self.question, author=author, body='Settled answer')
+        old = timezone.now() - timedelta(days=800)
+        Question.objects.update(created_at=old)
+        Comment.objects.update(created_at=old, updated_at=old)
+        Question.objects.create(title='Live question', author=author)
+        archive_stale_threads(months=12)
+
+    def test_build_renders_archived_threads_incrementally(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.assertEqual(build_snapshots(root), (1, 0, 0))
+            page = Path(root) / 'questions' / self.question.slug / 'index.html'
+            html = page.read_bytes()
+            self.assertIn(b'Settled answer', html)
+            self.assertIn(f'https://forum.example.com/questions/{self.question.slug}/'.encode(), html)
+            self.assertEqual(gzip.decompress(page.with_suffix('.html.gz').read_bytes()), html)
+            self.assertEqual(build_snapshots(root), (0, 0, 1))
+
+            commenter = User.objects.create_user(username='pupil', password='pupil-pass-1234')
+            unarchive_question(self.question)
+            old = Comment.objects.get().created_at
+            Comment.objects.create(question=self.question, author=commenter, body='Late thought')
+            Comment.objects.update(created_at=old, updated_at=old)
+            archive_stale_threads(months=12)
+            self.assertEqual(build_snapshots(root), (1, 0, 0))
+            commenter.username = 'scholar'
+            commenter.save()
+            self.assertEqual(build_snapshots(root), (1, 0, 0))
+            self.assertIn(b'scholar', page.read_bytes())
+
+            with override_settings(SNAPSHOT_ROOT=root):
+                unarchive_question(self.question)
+            self.assertFalse(page.exists())
+            self.assertEqual(build_snapshots(root), (0, 1, 0))
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='compressor', password='compressor-pass-1234')
+        for index in range(5):
+            Question.objects.create(title=f'Compressible question {index}', body='Long body ' * 50, author=author)
+
+    def test_front_page_cache_serves_stored_gzip_bytes(self):
+        first = self.client.get(reverse('question_list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('question_list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', second['Vary'])
+        # Compression adds random bytes per call, so identical bodies mean the cached variant was reused.
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b'Compressible question 4', gzip.decompress(second.content))
+
+        plain = self.client.get(reverse('question_list'), HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain.content, gzip.decompress(second.content))
+
+    def test_event_streams_and_small_responses_pass_through(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = CompressionMiddleware(lambda request: None)
+
+        stream = StreamingHttpResponse(iter([b'data: x\n\n'] * 500), content_type='text/event-stream')
+        self.assertFalse(middleware.process_response(request, stream).has_header('Content-Encoding'))
+
+        api = self.client.get(reverse('api_question_list'), {'fields': 'id,body'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(api['Content-Encoding'], 'gzip')
+        with override_settings(COMPRESSION_MIN_BYTES=len(api.content) * 100):
+            api = self.client.get(reverse('api_question_list'), {'fields': 'id,body'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(api.has_header('Content-Encoding'))
+
+
+class CachedSessionUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='warden', password='warden-pass-1234')
+        self.client.force_login(self.admin)
+
+    def test_session_user_is_cached_until_saved(self):
+        self.client.get(reverse('metrics'))
+        with self.assertNumQueries(1):  # session lookup only
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_impersonation_target_follows_profile_and_user_saves(self):
+        target = User.objects.create_user(username='understudy', password='understudy-pass-1234')
+        self.client.post(reverse('impersonate_start'), {'user_id': target.pk})
+        self.assertContains(self.client.get(reverse('question_list')), 'posting as understudy')
+
+        target.username = 'lead'
+        target.save()
+        self.assertContains(self.client.get(reverse('question_list')), 'posting as lead')
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='byliner', password='byliner-pass-1234')
+        self.question = Question.objects.create(title='Directory thread', author=self.author)
+        Comment.objects.create(question=self.question, author=self.author, body='Signed comment')
+
+    def test_thread_renders_bylines_without_profile_joins(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        self.assertNotContains(response, 'hn-user--vip')
+        self.assertFalse([query for query in context.captured_queries if 'questions_profile' in query['sql']])
+
+        self.author.profile.is_vip = True
+        self.author.profile.save()
+        response = self.client.get(reverse('question_detail_slug', args=[self.question.slug]))
+        self.assertContains(response, 'hn-user--vip', count=2)
+
+    def test_unrelated_saves_keep_the_directory(self):
+        self.assertEqual(bylines([self.author.pk])[self.author.pk].username, 'byliner')
+        self.author.last_login = timezone.now()
+        self.author.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.assertEqual(bylines([self.author.pk])[self.author.pk].username, 'byliner')
+
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(bylines([self.author.pk])[self.author.pk].username, 'renamed')
+
+
+class StreamedThreadTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='orator', password='orator-pass-1234')
+        self.question = Question.objects.create(title='Endless thread', author=author)
+        for index in range(4):
+            root = Comment.objects.create(question=self.question, author=author, body=f'Root {index}')
+            reply = Comment.objects.create(question=self.question, author=author, body=f'Reply {index}', parent=root)
+            Comment.objects.create(question=self.question, author=author, body=f'Nested {index}', parent=reply)
+        self.url = reverse('question_detail_slug', args=[self.question.slug])
+        # Anonymous pages are rendered whole for the stale-copy fallback; readers with a session are streamed.
+        self.client.force_login(author)
+
+    def test_streamed_thread_matches_rendered_tree(self):
+        with override_settings(STREAMING_THREAD_MIN_COMMENTS=1000):
+            rendered = self.client.get(self.url).content.decode()
+        with override_settings(STREAMING_THREAD_MIN_COMMENTS=10):
+            response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        streamed = b''.join(response.streaming_content).decode()
+
+        comment_ids = re.compile(r'data-comment-id="(\d+)"')
+        self.assertEqual(comment_ids.findall(streamed), comment_ids.findall(rendered))
+        for tag in ('<ul', '</ul>', '<li', '</li>'):
+            self.assertEqual(streamed.count(tag), rendered.count(tag), tag)
+        self.assertIn('<ul class="hn-comment-children" data-collapsible="true"><li class="hn-comment"', streamed)
+
+    @override_settings(STREAMING_THREAD_MIN_COMMENTS=10)
+    def test_logged_in_reader_gets_comment_actions_in_stream(self):
+        self.client.force_login(self.question.author)
+        response = self.client.get(self.url)
+        streamed = b''.join(response.streaming_content).decode()
+        self.assertEqual(streamed.count('class="hn-comment-edit"'), 12)
+        self.assertIn(f'?next={self.url}"', streamed)
+
+    @override_settings(STREAMING_THREAD_MIN_COMMENTS=10)
+    def test_gzipped_stream_flushes_the_page_head_first(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        parts = iter(response.streaming_content)
+        decompressor = zlib.decompressobj(wbits=31)
+        head = decompressor.decompress(next(parts) + next(parts))
+        self.assertIn(b'Endless thread', head)
+        self.assertNotIn(b'Root 0', head)
+
+
+class StaleFallbackTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        breaker.record_success()
+        self.addCleanup(breaker.record_success)
+        author = User.objects.create_user(username='steady', password='steady-pass-1234')
+        self.question = Question.objects.create(title='Survives outages', author=author)
+        Comment.objects.create(question=self.question, author=author, body='Still here')
+        self.thread_url = reverse('question_detail_slug', args=[self.question.slug])
+
+    @staticmethod
+    def failing_database(execute, sql, params, many, context):
+        raise OperationalError('server closed the connection unexpectedly')
+
+    def test_database_error_serves_last_known_good_page_and_refreshes_once(self):
+        fresh = self.client.get(reverse('question_list'))
+        caching.invalidate_front_page()
+        with (
+            patch('questions.fallback.threading.Thread') as thread,
+            connection.execute_wrapper(self.failing_database),
+            self.assertLogs('questions.fallback', 'WARNING') as logs,
+        ):
+            stale = self.client.get(reverse('question_list'))
+            again = self.client.get(reverse('question_list'))
+        self.assertIn('Serving stale front_page:hot after database error', logs.output[0])
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['Warning'], '110 - "Response is Stale"')
+        self.assertEqual(stale.content, fresh.content)
+        self.assertEqual(again.content, fresh.content)
+        self.assertEqual(thread.return_value.start.call_count, 1)
+
+        with self.assertLogs('django.request', 'ERROR'), connection.execute_wrapper(self.failing_database):
+            with self.assertRaises(OperationalError):
+                self.client.get(reverse('question_list'), {'sort': 'new'})
+        self.client.force_login(self.question.author)
+        with self.assertLogs('django.request', 'ERROR'), connection.execute_wrapper(self.failing_database):
+            with self.assertRaises(OperationalError):
+                self.client.get(self.thread_url)
+
+    @override_settings(DB_DEADLINE_SECONDS=0.05)
+    def test_slow_queries_fall_back_after_deadline(self):
+        fresh = self.client.get(self.thread_url)
+        self.assertIn(b'Still here', fresh.content)
+        cache.delete(f'stale:remembered:thread:{self.question.slug}')
+
+        def slow_database(execute, sql, params, many, context):
+            time.sleep(0.03)
+            return execute(sql, params, many, context)
+
+        with (
+            patch('questions.fallback.start_refresh'),
+            connection.execute_wrapper(slow_database),
+            self.assertLogs('questions.fallback', 'WARNING') as logs,
+        ):
+            stale = self.client.get(self.thread_url)
+        self.assertIn('after database deadline', logs.output[0])
+        self.assertTrue(stale.has_header('X-Stale-Age'))
+        self.assertEqual(stale.content, fresh.content)
+        self.assertIn('db_page_failures_total{reason="deadline"}', metrics.render_prometheus())
+
+    @override_settings(CIRCUIT_FAILURE_THRESHOLD=2, CIRCUIT_RESET_SECONDS=60)
+    def test_open_circuit_serves_stale_without_queries(self):
+        self.client.get(self.thread_url)
+        with (
+            patch('questions.fallback.start_refresh'),
+            connection.execute_wrapper(self.failing_database),
+            self.assertLogs('questions.fallback', 'WARNING'),
+        ):
+            self.client.get(self.thread_url)
+            self.assertIn('db_circuit_state 0', metrics.render_prometheus())
+            self.client.get(self.thread_url)
+        self.assertIn('db_circuit_state 2', metrics.render_prometheus())
+        with self.assertNumQueries(0):
+            response = self.client.get(self.thread_url)
+        self.assertEqual(response['Warning'], '110 - "Response is Stale"')
+
+        breaker.opened_at -= 60
+        with patch('questions.fallback.start_refresh', return_value=True) as refresh:
+            self.client.get(self.thread_url)
+            self.client.get(self.thread_url)
+        self.assertEqual(refresh.call_count, 1)
+        self.assertIn('db_circuit_state 1', metrics.render_prometheus())
+
+    @override_settings(STREAMING_THREAD_MIN_COMMENTS=1)
+    def test_large_thread_falls_back_instead_of_streaming(self):
+        fresh = self.client.get(self.thread_url)
+        self.assertFalse(fresh.streaming)
+        self.assertIn(b'Still here', fresh.content)
+
+        failed = []
+
+        def fail_on_comments(execute, sql, params, many, context):
+            # The thread page gets as far as reading the comment tree, where a streamed page would already be sent.
+            if 'questions_comment' in sql:
+                failed.append(sql)
+                raise OperationalError('canceling statement due to statement timeout')
+            return execute(sql, params, many, context)
+
+        with (
+            patch('questions.fallback.start_refresh'),
+            connection.execute_wrapper(fail_on_comments),
+            self.assertLogs('questions.fallback', 'WARNING'),
+        ):
+            stale = self.client.get(self.thread_url)
+        self.assertTrue(failed)
+        self.assertFalse(stale.streaming)
+        self.assertEqual(stale['Warning'], '110 - "Response is Stale"')
+        self.assertEqual(stale.content, fresh.content)
+        self.assertEqual(breaker.failures, 1)
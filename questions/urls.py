@@ -1,12 +1,18 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.question_list, name='question_list'),
+    path('events/', views.front_page_events, name='front_page_events'),
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('u/<str:username>/', views.profile_detail, name='profile_detail'),
     path('comments/<int:pk>/edit/', views.comment_edit, name='comment_edit'),
     path('questions/<int:pk>/', views.question_detail, name='question_detail'),
+    path('questions/<int:pk>/comments/updates/', views.question_comment_updates, name='question_comment_updates'),
+    path('questions/<int:pk>/events/', views.question_events, name='question_events'),
     path('questions/<int:pk>/upvote/', views.question_upvote, name='question_upvote'),
     path('questions/<int:pk>/pin/', views.question_pin_toggle, name='question_pin_toggle'),
     path('questions/<slug:slug>/', views.question_detail_slug, name='question_detail_slug'),
@@ -15,4 +21,8 @@ urlpatterns = [
     path('impersonate/stop/', views.impersonate_stop, name='impersonate_stop'),
     path('signup/', views.signup, name='signup'),
     path('account/delete/', views.account_delete, name='account_delete'),
+    path('api/questions/', api.question_list, name='api_question_list'),
+    path('api/questions/<int:pk>/', api.question_detail, name='api_question_detail'),
+    path('api/questions/<int:pk>/comments/', api.question_comments, name='api_question_comments'),
+    path('api/users/<str:username>/', api.profile_detail, name='api_profile_detail'),
 ]
@@ -0,0 +1,76 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def cached_user(user_id):
+    """The user with their profile already attached, from the cache when possible; None if there is no such user."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('profile').filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.USER_CACHE_SECONDS)
+    return user
+
+
+def forget_users(user_ids):
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def get_session_user(request):
+    """
+    ``django.contrib.auth.get_user`` with the user row served from the cache.
+
+    Only the common case is handled here: a session for a configured backend
+    whose stored hash matches the cached user. Anything else (fallback secrets,
+    inactive or missing users) goes through Django's own lookup.
+    """
+    user_id = request.session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+    if request.session.get(auth.BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+    user = cached_user(User._meta.pk.to_python(user_id))
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if (
+        user is not None
+        and user.is_active
+        and session_hash
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        return user
+    return auth.get_user(request)
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_session_user(request)
+    return request._cached_user
+
+
+async def _auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_session_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that takes the session user (and profile) from the cache; see get_session_user."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_auser, request)
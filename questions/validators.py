@@ -1,6 +1,35 @@
+import gzip
+import hashlib
+import logging
+import mmap
+from pathlib import Path
+
+from django.contrib.auth import password_validation
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext as _
 
+logger = logging.getLogger(__name__)
+
+SPECIAL_CHARACTERS = frozenset("!@#$%^&*()_+-=[]{}|;:,.<>?")
+PASSWORD_DIGEST_SIZE = 8
+BUNDLED_PASSWORD_LIST_PATH = Path(password_validation.__file__).resolve().parent / 'common-passwords.txt.gz'
+
+
+def password_digest(password):
+    """8-byte SHA-1 prefix of a normalized password, the record format of the common-password list."""
+    normalized = password.lower().strip()
+    return hashlib.sha1(normalized.encode('utf-8')).digest()[:PASSWORD_DIGEST_SIZE]
+
+
+def read_password_source(path):
+    """Yield one candidate password per line from a plain-text or gzip-compressed list."""
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='ignore') as handle:
+        for line in handle:
+            line = line.rstrip('\r\n')
+            if line:
+                yield line
+
 
 class ComplexityPasswordValidator:
     """
@@ -18,29 +47,39 @@ class ComplexityPasswordValidator:
         self.min_special = min_special
     
     def validate(self, password, user=None):
-        if not any(c.isupper() for c in password):
+        uppercase = lowercase = digits = special = 0
+        for c in password:
+            if c.isupper():
+                uppercase += 1
+            elif c.islower():
+                lowercase += 1
+            elif c.isdigit():
+                digits += 1
+            elif c in SPECIAL_CHARACTERS:
+                special += 1
+
+        if uppercase < self.min_uppercase:
             raise ValidationError(
                 _("This password must contain at least %(min)d uppercase letter."),
                 code='password_no_uppercase',
                 params={'min': self.min_uppercase},
             )
         
-        if not any(c.islower() for c in password):
+        if lowercase < self.min_lowercase:
             raise ValidationError(
                 _("This password must contain at least %(min)d lowercase letter."),
                 code='password_no_lowercase',
                 params={'min': self.min_lowercase},
             )
         
-        if not any(c.isdigit() for c in password):
+        if digits < self.min_digits:
             raise ValidationError(
                 _("This password must contain at least %(min)d digit."),
                 code='password_no_digit',
                 params={'min': self.min_digits},
             )
         
-        special_chars = "!@#$%^&*()_+-=[]{}|;:,.<>?"
-        if not any(c in special_chars for c in password):
+        if special < self.min_special:
             raise ValidationError(
                 _("This password must contain at least %(min)d special character (!@#$%%^&*()_+-=[]{}|;:,.<>?)."),
                 code='password_no_special',
@@ -52,3 +91,62 @@ class ComplexityPasswordValidator:
             "Your password must contain at least one uppercase letter, "
             "one lowercase letter, one digit, and one special character."
         )
+
+
+class CommonPasswordListValidator:
+    """
+    Validate that the password is not in a prebuilt common-password list.
+
+    The list (see the build_password_list command) is a sorted array of
+    8-byte password digests. It is memory-mapped read-only, so every worker
+    process shares the same page-cache copy, and looked up with a binary
+    search, so breach lists with millions of entries stay cheap. When the file
+    has not been built, Django's bundled list is loaded into memory instead.
+    """
+
+    def __init__(self, password_list_path=None):
+        self.password_list_path = Path(password_list_path) if password_list_path else None
+        self._records = None
+
+    def _load_records(self):
+        if self._records is None:
+            try:
+                with open(self.password_list_path, 'rb') as handle:
+                    self._records = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (TypeError, OSError, ValueError):
+                logger.warning(
+                    "Common password list %s is unavailable; using Django's bundled list.",
+                    self.password_list_path,
+                )
+                digests = {
+                    password_digest(password)
+                    for password in read_password_source(BUNDLED_PASSWORD_LIST_PATH)
+                }
+                self._records = b''.join(sorted(digests))
+        return self._records
+
+    def __contains__(self, password):
+        records = self._load_records()
+        digest = password_digest(password)
+        low, high = 0, len(records) // PASSWORD_DIGEST_SIZE
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * PASSWORD_DIGEST_SIZE
+            record = records[offset:offset + PASSWORD_DIGEST_SIZE]
+            if record == digest:
+                return True
+            if record < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def validate(self, password, user=None):
+        if password in self:
+            raise ValidationError(
+                _("This password is too common."),
+                code='password_too_common',
+            )
+
+    def get_help_text(self):
+        return _("Your password can’t be a commonly used password.")
@@ -5,18 +5,43 @@ from urllib.error import URLError
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
+from django.conf import settings
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from django.db.models import Count, Exists, OuterRef
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.formats import date_format
+from django.views.decorators.http import require_GET
 
+from . import caching, events, metrics
+from .archive import archived_comments
+from .directory import attach_bylines
+from .fallback import serve_stale_on_db_failure
 from .forms import AccountDeletionForm, CommentForm, ProfileSettingsForm, QuestionForm, SignupForm
 from .models import Comment, Question, Vote
+from .profiling import wants_profile
+from .purge import schedule_account_deletion
+from .queries import (
+    hot_rank,
+    hot_sort_key,
+    latest_thread_change,
+    latest_thread_cursor,
+    new_feed_page,
+    question_feed,
+    thread_comments,
+    thread_updates,
+)
+from .ratelimit import rate_limit
+from .sse import event_stream
+from .streaming import stream_thread
+from .usercache import cached_user, forget_users
+from .warmup import run_warmup
 
 logger = logging.getLogger(__name__)
 IMPERSONATION_USER_ID_SESSION_KEY = 'admin_impersonation_user_id'
@@ -73,11 +98,12 @@ def get_impersonated_user(request):
     user_id = request.session.get(IMPERSONATION_USER_ID_SESSION_KEY)
     if not user_id:
         return None
-    try:
-        return User.objects.get(pk=user_id)
-    except User.DoesNotExist:
-        request.session.pop(IMPERSONATION_USER_ID_SESSION_KEY, None)
-        return None
+    # Looked up for the context processor and again for posting; load it once per request.
+    if not hasattr(request, '_impersonated_user'):
+        request._impersonated_user = cached_user(user_id)
+        if request._impersonated_user is None:
+            request.session.pop(IMPERSONATION_USER_ID_SESSION_KEY, None)
+    return request._impersonated_user
 
 
 def get_posting_user(request):
@@ -101,41 +127,78 @@ def _format_question_date(created_at, now):
     return date_format(timezone.localtime(created_at), "M j, Y")
 
 
+def _anonymous_get(request):
+    # Checked on the cookie alone: finding out who a session belongs to needs the database.
+    return request.method == 'GET' and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _front_page_key(request):
+    if not _anonymous_get(request) or request.GET.get('cursor'):
+        return None
+    return f"front_page:{'new' if request.GET.get('sort') == 'new' else 'hot'}"
+
+
+def _thread_page_key(request, slug):
+    return f'thread:{slug}' if _anonymous_get(request) else None
+
+
+@serve_stale_on_db_failure(_front_page_key)
 def question_list(request):
     sort = request.GET.get('sort')
+    cursor = request.GET.get('cursor') if sort == 'new' else None
+    cacheable = not request.user.is_authenticated and not cursor
+    if cacheable:
+        cached = caching.get_front_page(sort)
+        if cached is not None:
+            response = HttpResponse(cached[0])
+            response.gzip_content = cached[1]
+            return response
     now = timezone.now()
-    questions = (
-        Question.objects.select_related('author', 'author__profile')
-        .prefetch_related('comments')
-        .annotate(score=Count('votes', distinct=True), comments_count=Count('comments', distinct=True))
-    )
-    if request.user.is_authenticated:
-        questions = questions.annotate(
-            has_voted=Exists(Vote.objects.filter(question=OuterRef('pk'), user=request.user))
-        )
+    next_cursor = None
     if sort == 'new':
-        questions = questions.order_by('-pinned', '-created_at', '-score')
+        questions, next_cursor = new_feed_page(request.user, cursor)
     else:
-        gravity = 1.8
-        base_offset = 2.0
-        questions = list(questions)
+        questions = list(question_feed(request.user))
         for question in questions:
-            age_hours = max((now - question.created_at).total_seconds() / 3600.0, 0.0)
-            points = question.score or 0
-            comments = question.comments_count or 0
-            question.rank_score = (points + 0.8 * comments) / pow(age_hours + base_offset, gravity)
+            question.rank_score = hot_rank(question.score, question.comments_count, question.created_at, now)
         questions.sort(
-            key=lambda item: (
-                0 if item.pinned else 1,
-                -(item.rank_score or 0.0),
-                -(item.score or 0),
-                -item.created_at.timestamp(),
-            )
+            key=lambda item: hot_sort_key(item.pinned, item.rank_score, item.score, item.created_at)
         )
-    questions = list(questions)
+    attach_bylines(questions)
     for question in questions:
         question.display_date = _format_question_date(question.created_at, now)
-    return render(request, 'questions/question_list.html', {'questions': questions})
+    response = render(
+        request,
+        'questions/question_list.html',
+        {'questions': questions, 'next_cursor': next_cursor},
+    )
+    if cacheable:
+        response.gzip_content = caching.set_front_page(sort, response.content)[1]
+    return response
+
+
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    state = run_warmup()
+    return JsonResponse(
+        {
+            'status': 'ready' if state['ready'] else 'warming',
+            'warmup_seconds': state['duration'],
+            'error': state['error'],
+        },
+        status=200 if state['ready'] else 503,
+    )
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4')
 
 
 def profile_detail(request, username):
@@ -156,12 +219,7 @@ def profile_detail(request, username):
     else:
         settings_form = None
 
-    questions = (
-        Question.objects.filter(author=profile_user)
-        .select_related('author', 'author__profile')
-        .annotate(score=Count('votes', distinct=True), comments_count=Count('comments', distinct=True))
-        .order_by('-pinned', '-created_at')
-    )
+    questions = question_feed().filter(author=profile_user).order_by('-pinned', '-created_at')
     return render(
         request,
         'questions/profile.html',
@@ -174,13 +232,13 @@ def profile_detail(request, username):
     )
 
 
+@rate_limit('comment')
 def question_detail(request, pk):
     question = get_object_or_404(
-        Question.objects.select_related('author', 'author__profile')
-        .prefetch_related('comments__author', 'comments__author__profile')
-        .annotate(score=Count('votes')),
+        Question.objects.select_related('archive').annotate(score=Count('votes')),
         pk=pk,
     )
+    archive = getattr(question, 'archive', None)
     user_has_voted = False
     if request.user.is_authenticated:
         user_has_voted = Vote.objects.filter(question=question, user=request.user).exists()
@@ -189,6 +247,9 @@ def question_detail(request, pk):
         if request.path != canonical_url:
             return redirect(canonical_url, permanent=True)
     reply_parent = None
+    if archive is not None and request.method == 'POST':
+        # Archived threads are read-only.
+        return redirect('question_detail_slug', slug=question.slug)
     if request.method == 'POST':
         if not request.user.is_authenticated:
             login_next = reverse('question_detail_slug', args=[question.slug])
@@ -211,7 +272,31 @@ def question_detail(request, pk):
     else:
         form = CommentForm()
 
-    comments = list(question.comments.select_related('author', 'author__profile').order_by('created_at'))
+    # Pages that can fall back to a stale copy are rendered whole, so a database failure shows before any byte is sent.
+    streamable = not wants_profile(request) and not getattr(request, 'stale_fallback', False)
+    if archive is None and request.method == 'GET' and streamable:
+        comment_count = Comment.objects.filter(question=question).count()
+        if comment_count >= settings.STREAMING_THREAD_MIN_COMMENTS:
+            attach_bylines([question])
+            latest = latest_thread_change(question.pk)
+            return stream_thread(
+                request,
+                question.pk,
+                {
+                    'question': question,
+                    'comment_form': form,
+                    'user_has_voted': user_has_voted,
+                    'updates_cursor': latest_thread_cursor(question, [latest] if latest else []),
+                    'archived': False,
+                },
+            )
+
+    if archive is not None:
+        comments = archived_comments(archive)
+        question.score = archive.score
+    else:
+        comments = list(thread_comments(question.pk))
+    attach_bylines([question, *comments])
     comment_map = {}
     for comment in comments:
         comment_map.setdefault(comment.parent_id, []).append(comment)
@@ -234,19 +319,65 @@ def question_detail(request, pk):
             'reply_parent_id': reply_parent.id if reply_parent else None,
             'reply_parent_author': reply_parent.author.username if reply_parent else None,
             'user_has_voted': user_has_voted,
+            'updates_cursor': latest_thread_cursor(question, comments),
+            'archived': archive is not None,
         },
     )
 
 
+@serve_stale_on_db_failure(_thread_page_key)
+@rate_limit('comment')
 def question_detail_slug(request, slug):
-    question = get_object_or_404(
-        Question.objects.select_related('author', 'author__profile')
-        .prefetch_related('comments__author', 'comments__author__profile'),
-        slug=slug,
-    )
+    question = get_object_or_404(Question.objects.only('pk'), slug=slug)
     return question_detail(request, question.pk)
 
 
+@require_GET
+def question_comment_updates(request, pk):
+    """New and edited comments since ?cursor=, as rendered fragments with their parent ids."""
+    comments, next_cursor, has_more = thread_updates(pk, request.GET.get('cursor'))
+    if not comments and not Question.objects.filter(pk=pk).exists():
+        return JsonResponse({'error': 'Question not found.'}, status=404)
+    thread_path = reverse('question_detail', args=[pk])
+    attach_bylines(comments)
+    items = []
+    for comment in comments:
+        comment.children = []
+        items.append({
+            'id': comment.pk,
+            'parent_id': comment.parent_id,
+            'html': render_to_string(
+                'questions/_comment.html',
+                {'comment': comment, 'comment_next': thread_path},
+                request=request,
+            ),
+        })
+    response = JsonResponse({'comments': items, 'cursor': next_cursor, 'more': has_more})
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _event_stream_response(channel):
+    # Under uvicorn questions.sse answers these URLs ahead of Django; this path serves runserver and the test client.
+    response = StreamingHttpResponse(event_stream(channel), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell the nginx sidecar not to buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def question_events(request, pk):
+    """Server-Sent Events for one thread: comment changes and score updates."""
+    if not await Question.objects.filter(pk=pk).aexists():
+        return JsonResponse({'error': 'Question not found.'}, status=404)
+    return _event_stream_response(events.question_channel(pk))
+
+
+async def front_page_events(request):
+    """Server-Sent Events for the front page: new posts and score updates."""
+    return _event_stream_response(events.FRONT_PAGE_CHANNEL)
+
+
 @login_required
 def comment_edit(request, pk):
     comment = get_object_or_404(Comment.objects.select_related('question'), pk=pk)
@@ -276,16 +407,20 @@ def comment_edit(request, pk):
     )
 
 
+@rate_limit('vote')
 @login_required
 def question_upvote(request, pk):
-    question = get_object_or_404(Question, pk=pk)
-    if request.method != 'POST':
+    question = get_object_or_404(Question.objects.select_related('archive'), pk=pk)
+    if request.method != 'POST' or hasattr(question, 'archive'):
         return redirect('question_detail_slug', slug=question.slug)
     existing_vote = Vote.objects.filter(question=question, user=request.user)
     if existing_vote.exists():
         existing_vote.delete()
     else:
         Vote.objects.create(question=question, user=request.user)
+    score_event = {'type': 'score', 'question': question.pk, 'score': question.votes.count()}
+    events.publish(events.FRONT_PAGE_CHANNEL, score_event)
+    events.publish(events.question_channel(question.pk), score_event)
     next_url = request.POST.get('next') or reverse('question_detail_slug', args=[question.slug])
     return redirect(next_url)
 
@@ -301,6 +436,7 @@ def question_pin_toggle(request, pk):
     return redirect(next_url)
 
 
+@rate_limit('question')
 @login_required
 def question_create(request):
     if request.method == 'POST':
@@ -330,6 +466,7 @@ def question_create(request):
     return render(request, 'questions/question_form.html', {'form': form})
 
 
+@rate_limit('signup')
 def signup(request):
     if request.user.is_authenticated:
         return redirect('question_list')
@@ -360,7 +497,7 @@ def account_delete(request):
         form = AccountDeletionForm(user_to_delete, request.POST)
         if form.is_valid():
             logout(request)
-            user_to_delete.delete()
+            schedule_account_deletion(user_to_delete)
             return redirect('question_list')
     else:
         form = AccountDeletionForm(user_to_delete)
@@ -377,6 +514,7 @@ def impersonate_start(request):
     if not target_user:
         return redirect(next_url)
     request.session[IMPERSONATION_USER_ID_SESSION_KEY] = target_user.pk
+    forget_users([target_user.pk])
     return redirect(next_url)
 
 
@@ -385,5 +523,7 @@ def impersonate_stop(request):
     if request.method != 'POST' or not request.user.is_superuser:
         return redirect('question_list')
     next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or reverse('question_list')
-    request.session.pop(IMPERSONATION_USER_ID_SESSION_KEY, None)
+    user_id = request.session.pop(IMPERSONATION_USER_ID_SESSION_KEY, None)
+    if user_id:
+        forget_users([user_id])
     return redirect(next_url)
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.template.loader import get_template
+from django.urls import reverse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEMPLATES = (
+    'base.html',
+    'questions/question_list.html',
+    'questions/question_detail.html',
+    'questions/_comment.html',
+    'questions/profile.html',
+    'questions/question_form.html',
+    'registration/login.html',
+    'registration/signup.html',
+)
+
+_lock = threading.Lock()
+_state = {'ready': False, 'duration': None, 'error': None}
+
+
+def anonymous_request(path='/', query_string=''):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'QUERY_STRING': query_string,
+    }
+    request.GET = QueryDict(query_string)
+    request.user = AnonymousUser()
+    return request
+
+
+def run_warmup():
+    """Prime a fresh worker once: URL resolver, DB connections, templates and the front-page cache."""
+    with _lock:
+        if _state['ready']:
+            return dict(_state)
+        from .views import question_list
+
+        started = time.monotonic()
+        try:
+            reverse('question_list')
+            for alias in connections:
+                connections[alias].ensure_connection()
+            for template_name in WARMUP_TEMPLATES:
+                get_template(template_name)
+            question_list(anonymous_request('/'))
+            question_list(anonymous_request('/', 'sort=new'))
+        except Exception as exc:
+            logger.exception("Warm-up failed")
+            _state.update(ready=False, error=str(exc))
+        else:
+            _state.update(ready=True, duration=time.monotonic() - started, error=None)
+            metrics.set_gauge('warmup_duration_seconds', _state['duration'])
+            logger.info("Warm-up finished in %.3fs", _state['duration'])
+        return dict(_state)